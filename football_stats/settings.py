@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+from datetime import timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'stats.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +88,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # update_teams --workers writes from several processes at once: wait for the write
+        # lock instead of failing, and take it when a transaction starts to avoid upgrade deadlocks
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
     }
 }
 
@@ -132,9 +141,143 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+CACHE_DIR = os.getenv('CACHE_DIR', BASE_DIR / 'cache')
+
 CACHES = {
+    # A per-process LRU (stats/cache_backends.py) in front of the shared cache below
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'BACKEND': 'stats.cache_backends.TieredCache',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            # Longest time a process keeps serving an entry another process changed
+            'LOCAL_TIMEOUT': 30,
+        },
+    },
+    # Files shared by every web and worker process on the host, kept across restarts
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+# Search results are cached until a player or team changes, or for at most this many seconds
+SEARCH_CACHE_TIMEOUT = 300
+# Rendered team and player pages are cached under their ETag, and the version rows the ETags
+# come from until the team or player is written; these bound how long unused entries are kept
+PAGE_RENDER_CACHE_TIMEOUT = 60 * 60 * 6
+PAGE_VALIDATORS_TIMEOUT = 60 * 60
+
+
+# Origin of the scraped site, without a trailing slash
+PREMIER_LEAGUE_URL = os.getenv('PREMIER_LEAGUE_URL', 'https://www.premierleague.com')
+
+# Headless Chrome sessions shared by the Selenium scrapers (stats/browser.py)
+SCRAPER_BROWSER_POOL_SIZE = int(os.getenv('SCRAPER_BROWSER_POOL_SIZE', 2))
+# Each lease loads one page, so a session is recycled after this many scrapes
+SCRAPER_BROWSER_MAX_PAGES = int(os.getenv('SCRAPER_BROWSER_MAX_PAGES', 50))
+# Seconds to wait for a free session before giving up
+SCRAPER_BROWSER_LEASE_TIMEOUT = 60
+
+# Concurrent player stats fetching (stats.scrape.scrape_players_data)
+SCRAPER_HTTP_CONCURRENCY = int(os.getenv('SCRAPER_HTTP_CONCURRENCY', 8))
+# (connect, read) timeout in seconds for each upstream request
+SCRAPER_HTTP_TIMEOUT = (5, 20)
+# Processes parsing downloaded pages; 0 or 1 parses in the fetching threads
+SCRAPER_PARSE_WORKERS = int(os.getenv('SCRAPER_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+# Player stats page parser: 'lxml' (targeted XPath lookups) or 'bs4' (BeautifulSoup with html.parser)
+SCRAPER_HTML_PARSER = os.getenv('SCRAPER_HTML_PARSER', 'lxml')
+
+# Upstream throttling (stats/throttle.py), shared by every scraper process through the database.
+# Each host gets a token bucket whose rate grows by SCRAPER_RATE_INCREASE per good response and
+# is multiplied by SCRAPER_RATE_DECREASE on a 429, a 5xx, an error or a response slower than
+# SCRAPER_SLOW_RESPONSE seconds (AIMD), staying between SCRAPER_RATE_MIN and SCRAPER_RATE_MAX
+SCRAPER_RATE_MAX = float(os.getenv('SCRAPER_RATE_MAX', 8))  # requests per second per host
+SCRAPER_RATE_MIN = 0.2
+SCRAPER_RATE_BURST = SCRAPER_HTTP_CONCURRENCY
+SCRAPER_RATE_INCREASE = 0.25
+SCRAPER_RATE_DECREASE = 0.5
+SCRAPER_SLOW_RESPONSE = 5
+# Failed, rate-limited and 5xx fetches are retried after a random delay of up to
+# SCRAPER_RETRY_DELAY * 2**attempt seconds (or the host's Retry-After); a fetch that would
+# have to wait longer than SCRAPER_RETRY_MAX_DELAY gives up instead
+SCRAPER_FETCH_RETRIES = 3
+SCRAPER_RETRY_DELAY = 1
+SCRAPER_RETRY_MAX_DELAY = 30
+# After this many consecutive failures a host gets no requests for SCRAPER_CIRCUIT_COOLDOWN
+# seconds; then a single probe decides whether it opens again
+SCRAPER_CIRCUIT_FAILURES = 5
+SCRAPER_CIRCUIT_COOLDOWN = 60
+
+# Squad and club index pages are parsed from static HTML; when the markup lacks the
+# needed fields, load the page in headless Chrome instead (False: give up)
+SCRAPER_SELENIUM_FALLBACK = os.getenv('SCRAPER_SELENIUM_FALLBACK', 'true').lower() == 'true'
+
+# Leaderboards (stats/leaderboards.py): how often, in seconds, a process applies the changes
+# other processes logged (see Change), and the largest ?limit= served
+LEADERBOARD_SYNC_INTERVAL = 60
+LEADERBOARD_MAX_LIMIT = 100
+
+# Stale-while-revalidate (stats/freshness.py): scraped data older than its TTL is still
+# served, and the first request after expiry queues a background refresh
+SCRAPE_TTL = {
+    'teams': timedelta(hours=24),  # club list
+    'team': timedelta(hours=24),  # club squad
+    'player': timedelta(hours=12),  # player details and stats
+}
+
+# Background scrape queue (stats/jobs.py, run by `manage.py scrape_worker`)
+SCRAPE_JOB_MAX_ATTEMPTS = 5
+SCRAPE_JOB_RETRY_DELAY = 30  # seconds before the first retry, doubled on each attempt
+SCRAPE_JOB_LOCK_TIMEOUT = 60 * 15  # a running job older than this is assumed dead and retried
+SCRAPE_JOB_POLL_INTERVAL = 2  # seconds an idle worker waits before checking the queue again
+# Finished jobs are kept this long (longer than any SCRAPE_TTL: the views look for a recent
+# scrape), then an idle worker deletes them, at most once per SCRAPE_JOB_PRUNE_INTERVAL seconds
+SCRAPE_JOB_RETENTION = timedelta(days=2)
+SCRAPE_JOB_PRUNE_INTERVAL = 60 * 60
+SCRAPE_PENDING_RETRY_AFTER = 5  # seconds before a "loading" page reloads itself
+
+# Single-flight scraping (stats/singleflight.py): one scrape per squad or player at a time,
+# across threads and processes; later callers wait for it and reuse what it stored
+SINGLE_FLIGHT_LOCK_TIMEOUT = 60 * 10  # a holder that hasn't finished by then is assumed dead
+SINGLE_FLIGHT_WAIT = 60 * 2  # how long a scraper waits for the holder before giving up
+SINGLE_FLIGHT_POLL_INTERVAL = 0.2
+# How long a request waits for the scrape it queued before answering with the loading page
+SCRAPE_REQUEST_WAIT = 3
+
+# Cache-Control max-age (seconds) of team and player pages; after that browsers and the CDN
+# revalidate with the page's ETag / Last-Modified and usually get a 304
+PAGE_CACHE_MAX_AGE = 60
+
+# Every page fetched over HTTP is kept, gzip-compressed and deduplicated by content, so
+# `manage.py reparse` can rebuild player data without touching the network
+SNAPSHOTS_ENABLED = True
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', BASE_DIR / 'snapshots')
+
+# Image proxy (stats/images.py): player photos, flags and crests are downloaded once, stored by
+# content (identical images share one file) and served from /media/ with immutable cache headers
+IMAGE_DIR = os.getenv('IMAGE_DIR', BASE_DIR / 'images')
+# Resized variants, generated once per image: name -> bounding box (width, height)
+IMAGE_SIZES = {'thumb': (100, 140)}
+# How often, in seconds, a process reloads its index of stored images to see other processes' downloads
+IMAGE_INDEX_REFRESH = 60
+# Images that can't be stored (SVGs, upstream errors) are linked to upstream, and not fetched
+# again for this many seconds
+IMAGE_FAILURE_TIMEOUT = 60 * 10
+
+# Per-process request, query, scrape and cache metrics at /metrics (stats/metrics.py)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Also report the time spent per category (db, fetch, parse, render, ...) in a Server-Timing header
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'false').lower() == 'true'
+
+# JSON API (stats/api.py): rows per page by default, and the most a client may ask for with ?limit=
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'UNAUTHENTICATED_USER': None,
 }
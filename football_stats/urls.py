@@ -16,8 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
+from stats.views import media, media_fetch, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('stats.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('media/<str:size>/<str:name>', media, name='media'),
+    path('media/<str:size>/fetch/<str:token>', media_fetch, name='media_fetch'),
 ]
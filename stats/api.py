@@ -0,0 +1,146 @@
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, pagination, serializers, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Change, Team, Player, PlayerStat
+from .serializers import ChangeSerializer, PlayerSerializer, PlayerStatSerializer, TeamSerializer
+
+
+class CursorPagination(pagination.CursorPagination):
+    """Opaque next/previous cursors: stable under inserts, and no COUNT(*) per page."""
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        return view.ordering
+
+
+class SparseFieldsViewSet(viewsets.ReadOnlyModelViewSet):
+    """Loads only the columns of the fields the request asked for (see SparseFieldsSerializer)."""
+    pagination_class = CursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # The cursor is read from the ordering fields of the last row, so they are always loaded
+        columns = self.get_serializer_class().columns(self.request) + [field.lstrip('-') for field in self.ordering]
+        related = {column.split('__')[0] for column in columns if '__' in column}
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+    def filter_by_team(self, queryset, field='team'):
+        # ?team= takes an id or a name, like the leaderboards
+        team = self.request.query_params.get('team')
+        if not team:
+            return queryset
+        if team.isdigit():
+            return queryset.filter(**{f'{field}_id': int(team)})
+        return queryset.filter(**{f'{field}__name__iexact': team.replace('-', ' ')})
+
+
+class TeamViewSet(SparseFieldsViewSet):
+    """Clubs. /teams/<id>/squad/ lists a club's players, with the same fields and filters as /players/."""
+    queryset = Team.objects.all()
+    serializer_class = TeamSerializer
+    ordering = ('name', 'id')
+
+    @action(detail=True)
+    def squad(self, request, pk=None):
+        team = get_object_or_404(Team.objects.only('id'), pk=pk)
+        view = PlayerViewSet(request=request, format_kwarg=self.format_kwarg, action='list')
+        queryset = view.get_queryset().filter(team=team)
+        page = view.paginate_queryset(queryset)
+        return view.get_paginated_response(view.get_serializer(page, many=True).data)
+
+
+class PlayerViewSet(SparseFieldsViewSet):
+    """Players, filtered by ?team= and ?position=. The stats blob is only included with ?fields=...,stats."""
+    queryset = Player.objects.all()
+    serializer_class = PlayerSerializer
+    ordering = ('name', 'player_id')
+
+    def get_queryset(self):
+        queryset = self.filter_by_team(super().get_queryset())
+        position = self.request.query_params.get('position')
+        if position:
+            queryset = queryset.filter(position__iexact=position)
+        return queryset
+
+    @action(detail=True)
+    def stats(self, request, pk=None):
+        """The player's stats as rows, one per stat and season."""
+        view = PlayerStatViewSet(request=request, format_kwarg=self.format_kwarg, action='list')
+        queryset = view.get_queryset().filter(player_id=pk)
+        page = view.paginate_queryset(queryset)
+        return view.get_paginated_response(view.get_serializer(page, many=True).data)
+
+
+class PlayerStatViewSet(SparseFieldsViewSet):
+    """Stat rows, filtered by ?player=, ?team=, ?category=, ?name= and ?season= (default: all seasons)."""
+    queryset = PlayerStat.objects.all()
+    serializer_class = PlayerStatSerializer
+    ordering = ('id',)
+
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = self.filter_by_team(super().get_queryset(), field='player__team')
+        queryset = queryset.filter(season=params.get('season', PlayerStat.ALL_SEASONS))
+        if params.get('player', '').isdigit():
+            queryset = queryset.filter(player_id=int(params['player']))
+        for field in ('category', 'name'):
+            if params.get(field):
+                queryset = queryset.filter(**{f'{field}__iexact': params[field]})
+        return queryset
+
+
+class SincePagination(pagination.BasePagination):
+    """
+    Pages of an append-only log after ?since=<cursor>. The cursor is the id of the last row
+    returned; `next` carries it and stays valid when the log grows, so a client that saves it
+    picks up exactly the rows written since its last sync.
+    """
+    page_size = settings.API_PAGE_SIZE
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        since = request.query_params.get('since', '0')
+        if not since.isdigit():
+            raise serializers.ValidationError({'since': 'Expected the cursor of an earlier response'})
+        try:
+            limit = pagination._positive_int(request.query_params['limit'], strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            limit = self.page_size
+
+        # One extra row tells whether the client is caught up
+        rows = list(queryset.filter(pk__gt=int(since)).order_by('pk')[:limit + 1])
+        self.has_more = len(rows) > limit
+        rows = rows[:limit]
+        self.cursor = rows[-1].pk if rows else int(since)
+        self.request = request
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'cursor': self.cursor,
+            'has_more': self.has_more,
+            'next': replace_query_param(self.request.build_absolute_uri(), 'since', self.cursor),
+            'results': data,
+        })
+
+
+class ChangeList(generics.ListAPIView):
+    """Team and player changes after ?since=, oldest first; ?kind=team or ?kind=player picks one."""
+    queryset = Change.objects.all()
+    serializer_class = ChangeSerializer
+    pagination_class = SincePagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        kind = self.request.query_params.get('kind')
+        if kind:
+            queryset = queryset.filter(kind=kind)
+        return queryset
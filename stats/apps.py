@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class StatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stats'
+
+    def ready(self):
+        # Keep the FTS5 player search tables (stats/search.py) in sync with the Player and Team tables
+        from . import signals  # noqa: F401
+
+        # Per-request query counts for MetricsMiddleware, on every connection as it is opened
+        from django.db.backends.signals import connection_created
+        from . import metrics
+        connection_created.connect(metrics.instrument_connection)
@@ -0,0 +1,126 @@
+import atexit
+import functools
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+from .metrics import instrumented
+
+
+class BrowserPoolTimeout(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def get_driver_path():
+    # ChromeDriverManager checks (and possibly downloads) the driver, only do it once per process
+    return ChromeDriverManager().install()
+
+
+@instrumented('selenium')
+def new_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    return webdriver.Chrome(service=Service(get_driver_path()), options=options)
+
+
+class BrowserSession:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+    def is_healthy(self):
+        try:
+            # Any round trip to the browser fails once Chrome has crashed or been closed
+            self.driver.current_url
+            return True
+        except WebDriverException:
+            return False
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error closing browser session: {e}")
+
+
+class BrowserPool:
+    """A bounded pool of warm headless Chrome sessions shared by the scrapers."""
+
+    def __init__(self, size, max_pages, lease_timeout=None, driver_factory=new_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.lease_timeout = lease_timeout
+        self.driver_factory = driver_factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def lease(self):
+        if not self._slots.acquire(timeout=self.lease_timeout):
+            raise BrowserPoolTimeout(f"No browser available after {self.lease_timeout}s")
+
+        try:
+            session = self._checkout()
+            try:
+                yield session.driver
+            finally:
+                session.pages += 1
+                self._checkin(session)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.quit()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                return BrowserSession(self.driver_factory())
+            if session.is_healthy():
+                return session
+            session.quit()
+
+    def _checkin(self, session):
+        # Recycle sessions that have loaded too many pages or crashed during the lease
+        if session.pages >= self.max_pages or not session.is_healthy():
+            session.quit()
+            return
+        with self._lock:
+            self._idle.append(session)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool(
+                    size=settings.SCRAPER_BROWSER_POOL_SIZE,
+                    max_pages=settings.SCRAPER_BROWSER_MAX_PAGES,
+                    lease_timeout=settings.SCRAPER_BROWSER_LEASE_TIMEOUT,
+                )
+                atexit.register(_pool.close)
+    return _pool
+
+
+def lease_browser():
+    return get_pool().lease()
@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .models import content_version
+
+
+# Bump when the shape of a cached value changes, so entries written by older code are never read back
+KEY_VERSION = 2
+
+TEAMS = 'teams'
+SQUAD = 'squad'
+PLAYER = 'player'
+SEARCH = 'search'
+IMAGE = 'image'
+# Rendered pages, keyed by their ETag, and the rows their ETags are computed from
+HTML = 'html'
+VALIDATORS = 'validators'
+
+
+def cache_key(namespace, *parts):
+    """
+    'stats:v1:<namespace>:<part>:...'. Squads and players put their content version in the key,
+    so a changed squad or player is simply a miss; namespaces without one use generation().
+    """
+    return ':'.join(['stats', f'v{KEY_VERSION}', namespace, *(str(part) for part in parts)])
+
+
+async def aget(key):
+    """cache.aget() that counts hits and misses per namespace in the metrics."""
+    value = await cache.aget(key)
+    metrics.cache_lookup(key.split(':')[2], value is not None)
+    return value
+
+
+def generation(namespace):
+    """A counter that is part of the keys of `namespace`; invalidate() moves every key to a new one."""
+    return cache.get_or_set(cache_key(namespace, 'generation'), 1, timeout=None)
+
+
+def invalidate(namespace):
+    key = cache_key(namespace, 'generation')
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def shared_cache():
+    """
+    The cache layer every process reads directly. TieredCache's per-process front layer can
+    serve an entry for LOCAL_TIMEOUT after another process deleted it, which entries under
+    fixed keys that are deleted on writes (the validators) can't afford.
+    """
+    return getattr(cache, 'shared', cache)
+
+
+def cached_validators(kind, object_id, lookup):
+    """
+    The row conditional_page computes a page's ETag from (lookup(), or None if there is none),
+    cached until the persistence layer writes the team or player (see forget_validators), so
+    a hot page is answered without touching the database.
+    """
+    key = cache_key(VALIDATORS, kind, object_id)
+    row = shared_cache().get(key)
+    metrics.cache_lookup(VALIDATORS, row is not None)
+    if row is None:
+        row = lookup()
+        if row is not None:
+            shared_cache().set(key, row, settings.PAGE_VALIDATORS_TIMEOUT)
+    return row
+
+
+def forget_validators(kind, object_ids):
+    shared_cache().delete_many([cache_key(VALIDATORS, kind, object_id) for object_id in object_ids])
+
+
+def team_etag(version, updated_at):
+    # updated_at also moves when the squad changes, so it is part of the tag
+    return content_version(version, updated_at)
+
+
+def teams_etag(updated_at, count):
+    return content_version(updated_at, count)
+
+
+def search_key(query, limit=None):
+    # Queries are free text; hash them into a key every backend accepts
+    return cache_key(SEARCH, generation(SEARCH), content_version(query, limit))
+
+
+def team_entry(team):
+    return {'id': team.id, 'name': team.name, 'logo': team.crest}
+
+
+def squad_entry(team, players):
+    """What team_detail renders: the team and its players as plain dicts."""
+    return {
+        'team': {'id': team.id, 'name': team.name, 'crest': team.crest},
+        'players': [
+            {
+                'player_id': player.player_id,
+                'name': player.name,
+                'position': player.position,
+                'nationality': player.nationality,
+                'flag_image': player.flag_image,
+                'image': player.image,
+                # Each player card is a template fragment cached under the player's version
+                'version': player.version,
+            }
+            for player in players
+        ],
+    }
+
+
+def player_entry(player):
+    """What player_detail renders for a saved player."""
+    return {
+        'player': {
+            'name': player.name,
+            'position': player.position,
+            'nationality': player.nationality,
+            'flag_image': player.flag_image,
+            'stats': player.stats,
+        },
+        'image': player.image,
+    }
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.utils import timezone
+
+
+def ttl(entity):
+    """How long scraped data of an entity ('teams', 'team', 'player') is served without revalidation."""
+    return settings.SCRAPE_TTL[entity]
+
+
+def mark_scraped(obj, entity, now=None):
+    """Stamp a Team or Player as just scraped; the caller saves it."""
+    now = now or timezone.now()
+    obj.last_scraped_at = now
+    obj.expires_at = now + ttl(entity)
+
+
+def is_stale(obj):
+    return obj.expires_at is None or obj.expires_at <= timezone.now()
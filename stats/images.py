@@ -0,0 +1,164 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+
+from . import caching
+from .models import ImageAsset, Player, Team, content_version
+
+
+# Shown when a player has no photo (or it fails to load)
+MISSING_PHOTO = 'https://resources.premierleague.com/premierleague/photos/players/110x140/Photo-Missing.png'
+
+# What the proxy stores; anything else (SVG in particular) is left to the browser
+IMAGE_TYPES = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/gif': 'gif', 'image/webp': 'webp'}
+NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.(png|jpg|gif|webp)$')
+
+ORIGINAL = 'full'
+SIGNING_SALT = 'stats.images'
+
+# Source URL -> stored name, shared by the threads of this process. Stored images never change
+# or go away, so an entry that is out of date still points at a valid (older) image.
+_names = {}
+_names_loaded_at = None
+
+
+def sizes():
+    return [ORIGINAL, *settings.IMAGE_SIZES]
+
+
+def image_path(size, name):
+    return Path(settings.IMAGE_DIR) / size / name[:2] / name
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file and rename, so readers never see a partial image
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def variant(size, name):
+    """The file of an image in `size`, resizing the original the first time; None if unknown."""
+    if size not in sizes() or not NAME_PATTERN.match(name):
+        return None
+    path = image_path(size, name)
+    if path.exists():
+        return path
+    original = image_path(ORIGINAL, name)
+    if size == ORIGINAL or not original.exists():
+        return None
+
+    from io import BytesIO
+    from PIL import Image
+
+    with Image.open(original) as image:
+        image_format = image.format
+        image.thumbnail(settings.IMAGE_SIZES[size])
+        output = BytesIO()
+        image.save(output, format=image_format)
+    _write(path, output.getvalue())
+    return path
+
+
+def store(url, data, content_type):
+    """Keep a downloaded image and its resized variants. Returns its name, or None if it isn't one we serve."""
+    extension = IMAGE_TYPES.get(content_type.split(';')[0].strip().lower())
+    if extension is None:
+        return None
+
+    name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+    if not image_path(ORIGINAL, name).exists():
+        _write(image_path(ORIGINAL, name), data)
+    for size in settings.IMAGE_SIZES:
+        variant(size, name)
+
+    ImageAsset.objects.update_or_create(url=url, defaults={'name': name, 'fetched_at': timezone.now()})
+    _names[url] = name
+    return name
+
+
+def proxied(url):
+    return bool(url) and url.startswith(('https://', 'http://'))
+
+
+def fetch(url):
+    """
+    Download and store one image (for a URL that wasn't prefetched; runs as an 'image' scrape
+    job). Its name, or None if it can't be stored (an SVG, an upstream error, an open circuit).
+    Failures aren't tried again for IMAGE_FAILURE_TIMEOUT seconds.
+    """
+    failed_key = caching.cache_key(caching.IMAGE, 'failed', content_version(url))
+    if cache.get(failed_key):
+        return None
+
+    from .upstream import fetch_image
+
+    image = fetch_image(url)
+    name = store(url, *image) if image else None
+    if name is None:
+        cache.set(failed_key, True, settings.IMAGE_FAILURE_TIMEOUT)
+    return name
+
+
+def prefetch(urls):
+    """Download and store the images at `urls` that aren't stored yet. Returns how many were stored."""
+    stored = set(ImageAsset.objects.values_list('url', flat=True))
+    missing = {url for url in urls if proxied(url) and url not in stored}
+    if not missing:
+        return 0
+
+    from .upstream import fetch_images
+
+    return sum(1 for url, image in fetch_images(missing).items() if image and store(url, *image))
+
+
+def scraped_image_urls():
+    """Every crest, player photo and flag in the database, each once."""
+    urls = {MISSING_PHOTO}
+    urls.update(Team.objects.values_list('crest', flat=True))
+    for image, flag_image in Player.objects.values_list('image', 'flag_image'):
+        urls.update((image, flag_image))
+    return urls
+
+
+def stored_name(url):
+    global _names, _names_loaded_at
+    name = _names.get(url)
+    if name is None and (_names_loaded_at is None or time.monotonic() - _names_loaded_at > settings.IMAGE_INDEX_REFRESH):
+        # One query loads every stored image; misses reload it at most once per IMAGE_INDEX_REFRESH
+        _names = dict(ImageAsset.objects.values_list('url', 'name'))
+        _names_loaded_at = time.monotonic()
+        name = _names.get(url)
+    return name
+
+
+def media_url(url, size=ORIGINAL):
+    """
+    The local URL of an upstream image. Stored images get a URL named by their content, which
+    is cached for good; the others go through a signed URL that queues their download on first use.
+    """
+    if not proxied(url):
+        return url or ''
+    name = stored_name(url)
+    if name:
+        return reverse('media', args=[size, name])
+    return reverse('media_fetch', args=[size, signing.dumps(url, salt=SIGNING_SALT)])
+
+
+def unsign(token):
+    """The upstream URL a media_fetch token was made for; None if it was tampered with."""
+    try:
+        return signing.loads(token, salt=SIGNING_SALT)
+    except signing.BadSignature:
+        return None
@@ -0,0 +1,200 @@
+import asyncio
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics
+from .models import ScrapeJob, content_version
+
+
+# Requests waiting on missing data jump ahead of background revalidations
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+
+
+# Web processes import this module only to queue jobs; the scraping stack loads when a job runs
+def refresh_teams():
+    from . import scrape
+
+    scrape.scrape_team_data(refresh=True)
+
+
+def refresh_squad(team_id, club_name):
+    from . import scrape
+
+    scrape.scrape_club_squad(team_id, club_name, refresh=True)
+
+
+def refresh_player(player_id, player_name):
+    from . import scrape
+
+    player_data = scrape.refresh_player(player_id, player_name)
+    if player_data is None:
+        # Failed fetches are retried with backoff
+        raise RuntimeError(f"No data scraped for player {player_id}")
+    # Players that aren't in the database yet (no team to save them under) are served from the result
+    return player_data
+
+
+def fetch_image(url):
+    from . import images
+
+    # An image the proxy can't store is served from upstream; images.fetch remembers the failure
+    return images.fetch(url)
+
+
+HANDLERS = {
+    'teams': refresh_teams,
+    'squad': refresh_squad,
+    'player': refresh_player,
+    'image': fetch_image,
+}
+
+
+def job_key(kind, *args):
+    if kind == 'image':
+        # Image URLs can be longer than the key column
+        return f"{kind}:{content_version(*args)}"
+    # Only the entity id identifies the work; the name is just needed to build the URL
+    return f"{kind}:{args[0]}" if args else kind
+
+
+def enqueue(kind, *args, priority=PRIORITY_NORMAL):
+    """Queue a scrape unless the same one is already queued or running. Returns the job."""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown scrape job kind: {kind}")
+
+    key = job_key(kind, *args)
+    try:
+        with transaction.atomic():
+            return ScrapeJob.objects.create(
+                kind=kind, key=key, args=list(args), priority=priority, run_after=timezone.now()
+            )
+    except IntegrityError:
+        # Deduplicated; a request waiting on the data may still raise its priority
+        job = ScrapeJob.objects.filter(
+            key=key, status__in=[ScrapeJob.PENDING, ScrapeJob.RUNNING]
+        ).first()
+        if job and job.priority < priority:
+            ScrapeJob.objects.filter(pk=job.pk).update(priority=priority)
+            job.priority = priority
+        return job
+
+
+async def aenqueue(kind, *args, priority=PRIORITY_NORMAL):
+    # The insert-or-deduplicate needs a transaction, which the async ORM can't run
+    return await sync_to_async(enqueue)(kind, *args, priority=priority)
+
+
+def refresh(kind, *args, within):
+    """
+    Queue a background refresh of data that is being served stale, unless the same scrape is
+    queued, running, or finished in the last `within` (a timedelta). The check is a read, so
+    hot expired pages, 304s included, don't each take the write lock to find the job queued.
+    Returns the new job, or None.
+    """
+    active_or_recent = ScrapeJob.objects.filter(
+        Q(status__in=[ScrapeJob.PENDING, ScrapeJob.RUNNING])
+        | Q(status=ScrapeJob.DONE, finished_at__gte=timezone.now() - within),
+        key=job_key(kind, *args),
+    )
+    if active_or_recent.exists():
+        return None
+    return enqueue(kind, *args)
+
+
+async def arefresh(kind, *args, within):
+    return await sync_to_async(refresh)(kind, *args, within=within)
+
+
+async def arecently_done(kind, *args, within):
+    """The same scrape if it finished successfully in the last `within` (a timedelta), else None."""
+    return await ScrapeJob.objects.filter(
+        key=job_key(kind, *args), status=ScrapeJob.DONE, finished_at__gte=timezone.now() - within
+    ).order_by('-finished_at').afirst()
+
+
+async def await_for(job, timeout):
+    """
+    Poll a queued job for up to `timeout` seconds; True once it has finished successfully.
+    Sleeps on the event loop between polls, so a waiting request holds no thread.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        await job.arefresh_from_db(fields=['status', 'result', 'finished_at'])
+        if job.status in (ScrapeJob.DONE, ScrapeJob.FAILED) or time.monotonic() >= deadline:
+            return job.status == ScrapeJob.DONE
+        await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+
+
+def claim(worker_id):
+    """Take the next runnable job for `worker_id`, or None if there is nothing to do."""
+    now = timezone.now()
+    # Jobs whose worker died mid-run go back to the queue
+    expired = now - timedelta(seconds=settings.SCRAPE_JOB_LOCK_TIMEOUT)
+
+    candidates = ScrapeJob.objects.filter(
+        Q(status=ScrapeJob.PENDING, run_after__lte=now)
+        | Q(status=ScrapeJob.RUNNING, locked_at__lt=expired)
+    ).order_by('-priority', 'run_after')
+
+    for job in candidates[:10]:
+        # The conditional update is the lock: only one worker sees it affect a row
+        claimed = ScrapeJob.objects.filter(pk=job.pk, status=job.status, locked_at=job.locked_at).update(
+            status=ScrapeJob.RUNNING, locked_by=worker_id, locked_at=now, attempts=job.attempts + 1
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run(job):
+    """Run a claimed job, then mark it done or schedule a retry with exponential backoff."""
+    started = time.perf_counter()
+    try:
+        result = HANDLERS[job.kind](*job.args)
+    except Exception as e:
+        metrics.job_seconds.observe(time.perf_counter() - started, kind=job.kind, status='failed')
+        print(f"Scrape job {job.key} failed (attempt {job.attempts}): {e}")
+        job.last_error = traceback.format_exc()
+        if job.attempts >= settings.SCRAPE_JOB_MAX_ATTEMPTS:
+            job.status = ScrapeJob.FAILED
+            job.finished_at = timezone.now()
+        else:
+            delay = settings.SCRAPE_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.status = ScrapeJob.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+        job.locked_by = ''
+        job.locked_at = None
+        job.save()
+        return False
+
+    metrics.job_seconds.observe(time.perf_counter() - started, kind=job.kind, status='done')
+    job.status = ScrapeJob.DONE
+    job.result = result
+    job.finished_at = timezone.now()
+    job.locked_by = ''
+    job.locked_at = None
+    job.last_error = ''
+    job.save()
+    return True
+
+
+def prune():
+    """
+    Delete the jobs that finished (done or failed) more than SCRAPE_JOB_RETENTION ago; the
+    views only look back one TTL for a recent scrape. Returns how many were deleted.
+    """
+    cutoff = timezone.now() - settings.SCRAPE_JOB_RETENTION
+    deleted, _ = ScrapeJob.objects.filter(
+        status__in=[ScrapeJob.DONE, ScrapeJob.FAILED], finished_at__lt=cutoff
+    ).delete()
+    return deleted
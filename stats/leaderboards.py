@@ -0,0 +1,205 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Max
+from sortedcontainers import SortedList
+
+from .models import Change, Player, PlayerStat, stat_values
+
+
+class LeaderboardStore:
+    """
+    Precomputed rankings for every stat, overall and per position and team.
+
+    Each board is a SortedList of (-value, player_id), so a top-N read is a slice and a
+    player's stats changing is a handful of O(log n) removals and insertions. The store
+    is built from PlayerStat on first use and updated from the player_stats_saved signal;
+    writes made by other processes are picked up from the change log (Change), re-ranking
+    only the players changed since the last check.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._cursor = 0  # id of the last Change applied
+        self._checked_at = 0
+        self._values = {}   # player_id -> {stat key: value}
+        self._players = {}  # player_id -> name/team/position of the player
+        self._boards = {}   # (stat key, scope, scope value) -> SortedList of (-value, player_id)
+
+    def build(self):
+        with self._lock:
+            self._values.clear()
+            self._players.clear()
+            self._boards.clear()
+            # Taken first: changes written while the rows load are applied again by the next sync
+            self._cursor = Change.objects.aggregate(Max('id'))['id__max'] or 0
+
+            for player in Player.objects.select_related('team').defer('stats'):
+                self._players[player.pk] = self._describe(player)
+
+            rows = PlayerStat.objects.filter(season=PlayerStat.ALL_SEASONS)
+            for stat in rows.only('player_id', 'category', 'name', 'value').iterator():
+                self._values.setdefault(stat.player_id, {})[stat.key] = stat.value
+
+            for player_id, values in self._values.items():
+                self._insert(player_id, values)
+
+            self._checked_at = time.monotonic()
+            self._built = True
+
+    def sync(self):
+        """Build on first use, then apply the changes other processes logged since the last check."""
+        if not self._built:
+            with self._lock:
+                if not self._built:
+                    self.build()
+            return
+
+        if time.monotonic() - self._checked_at < settings.LEADERBOARD_SYNC_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self.apply_changes()
+
+    def apply_changes(self):
+        """
+        Re-rank the players in the Change rows after the cursor, from their current rows: a query
+        for the change ids, and for a non-empty batch one for the players and one for their stats.
+        Our own writes show up here too; re-ranking a player from unchanged rows is a no-op.
+        """
+        with self._lock:
+            player_ids, team_ids = set(), set()
+            for change_id, kind, object_id in Change.objects.filter(id__gt=self._cursor).order_by('id').values_list(
+                'id', 'kind', 'object_id'
+            ):
+                (player_ids if kind == Change.PLAYER else team_ids).add(object_id)
+                self._cursor = change_id
+            # A renamed club changes the team name shown next to its players
+            player_ids.update(
+                player_id for player_id, player in self._players.items() if player['team_id'] in team_ids
+            )
+            if not player_ids:
+                return
+
+            players = Player.objects.select_related('team').defer('stats').in_bulk(list(player_ids))
+            values = {}
+            rows = PlayerStat.objects.filter(season=PlayerStat.ALL_SEASONS, player_id__in=list(players))
+            for stat in rows.only('player_id', 'category', 'name', 'value').iterator():
+                values.setdefault(stat.player_id, {})[stat.key] = stat.value
+
+            for player_id in player_ids:
+                self._remove(player_id)
+                player = players.get(player_id)
+                if player is None:
+                    # Deleted
+                    self._players.pop(player_id, None)
+                    continue
+                self._players[player_id] = self._describe(player)
+                if player_id in values:
+                    self._values[player_id] = values[player_id]
+                    self._insert(player_id, values[player_id])
+
+    def update_players(self, players):
+        """Re-rank players whose stats changed in this process."""
+        if not self._built:
+            return
+        with self._lock:
+            for player in players:
+                self._remove(player.pk)
+                self._players[player.pk] = self._describe(player)
+                self._values[player.pk] = stat_values(player.stats)
+                self._insert(player.pk, self._values[player.pk])
+
+    def move_players(self, players):
+        """Players whose team, name or position changed keep their values but change boards."""
+        if not self._built:
+            return
+        with self._lock:
+            for player in players:
+                values = self._values.get(player.pk)
+                if values is not None:
+                    self._remove(player.pk)
+                    self._values[player.pk] = values
+                self._players[player.pk] = self._describe(player)
+                if values is not None:
+                    self._insert(player.pk, values)
+
+    def remove_players(self, player_ids):
+        """Players deleted in this process leave every board."""
+        if not self._built:
+            return
+        with self._lock:
+            for player_id in player_ids:
+                self._remove(player_id)
+                self._players.pop(player_id, None)
+
+    def stat_keys(self):
+        self.sync()
+        with self._lock:
+            return sorted({key for key, scope, _ in self._boards if scope is None})
+
+    def top(self, key, position=None, team_id=None, limit=10):
+        """Ranked entries for one stat, or None if no player has it."""
+        self.sync()
+
+        with self._lock:
+            if (key, None, None) not in self._boards:
+                return None
+
+            if team_id is not None:
+                board = self._boards.get((key, 'team', team_id), [])
+            elif position:
+                board = self._boards.get((key, 'position', position.lower()), [])
+            else:
+                board = self._boards[(key, None, None)]
+
+            results = []
+            for negative_value, player_id in board:
+                player = self._players[player_id]
+                # Team boards are a squad long, so filtering them by position is cheap
+                if position and player['position'] != position.lower():
+                    continue
+                results.append({'rank': len(results) + 1, 'value': -negative_value, **player})
+                if len(results) == limit:
+                    break
+            return results
+
+    def _insert(self, player_id, values):
+        player = self._players.get(player_id)
+        if player is None:
+            return
+        for key, value in values.items():
+            for board_key in self._board_keys(key, player):
+                self._boards.setdefault(board_key, SortedList()).add((-value, player_id))
+
+    def _remove(self, player_id):
+        values = self._values.pop(player_id, {})
+        player = self._players.get(player_id)
+        if player is None:
+            return
+        for key, value in values.items():
+            for board_key in self._board_keys(key, player):
+                board = self._boards.get(board_key)
+                if board is not None:
+                    board.discard((-value, player_id))
+                    if not board:
+                        del self._boards[board_key]
+
+    @staticmethod
+    def _board_keys(key, player):
+        return [(key, None, None), (key, 'position', player['position']), (key, 'team', player['team_id'])]
+
+    @staticmethod
+    def _describe(player):
+        return {
+            'player_id': player.pk,
+            'name': player.name,
+            'team_id': player.team_id,
+            'team': player.team.name if player.team_id else '',
+            'position': (player.position or '').lower(),
+        }
+
+
+leaderboards = LeaderboardStore()
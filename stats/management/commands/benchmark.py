@@ -0,0 +1,317 @@
+import json
+import platform
+import re
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from urllib.parse import urlsplit
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from stats.models import Player, Team
+from stats.scrape import PLAYER_PAGE_PARSERS
+from stats.snapshots import latest_snapshots, read_blob
+
+
+POSITIONS = ['Goalkeeper', 'Defender', 'Midfielder', 'Forward']
+
+# Metrics where a bigger number is better; for everything else (seconds, ms, queries) smaller is
+HIGHER_IS_BETTER = ('pages_per_second',)
+
+PAGE_ROUTES = [
+    ('clubs', re.compile(r'^/clubs/?$')),
+    ('squad', re.compile(r'^/clubs/(\d+)/[^/]+/squad$')),
+    ('stats', re.compile(r'^/players/(\d+)/[^/]+/stats$')),
+]
+
+
+def route(path):
+    """('clubs', None), ('squad', club_id) or ('stats', player_id) for a site path, else None."""
+    for kind, pattern in PAGE_ROUTES:
+        match = pattern.match(path)
+        if match:
+            return kind, int(match.group(1)) if match.groups() else None
+    return None
+
+
+def club_index_page(clubs):
+    cards = ''.join(
+        f'<li class="club-card-wrapper"><a href="/clubs/{club_id}/{name.replace(" ", "-")}/overview">'
+        f'<img srcset="/badges/{club_id}.png 1x, /badges/{club_id}@2x.png 2x"><h4>{name}</h4></a></li>'
+        for club_id, name in clubs
+    )
+    return f'<html><body><div class="clubIndex col-12"><ul>{cards}</ul></div></body></html>'
+
+
+def squad_page(players):
+    cards = ''.join(
+        f'<li><div class="stats-card" data-player-id="{player_id}">'
+        f'<img class="statCardImg" data-src="/photos/{player_id}.png" src="/placeholder.png">'
+        f'<h4 class="stats-card__player-name">{name}</h4>'
+        f'<div class="stats-card__player-position">{position}</div>'
+        f'<img class="stats-card__flag-icon" src="/flags/ENG.png">'
+        f'<span class="stats-card__player-country">England</span>'
+        f'</div></li>'
+        for player_id, name, position in players
+    )
+    return f'<html><body><ul class="squadListContainer">{cards}</ul></body></html>'
+
+
+def player_stats_page(player_id, position):
+    top = ''.join(
+        f'<div class="player-stats__top-stat"><span class="player-stats__top-stat-value">{label}'
+        f'<span class="allStatContainer">{(player_id * (i + 3)) % 400}</span></span></div>'
+        for i, label in enumerate(['Appearances', 'Wins', 'Losses'])
+    )
+    categories = {
+        'Attack': ['Goals', 'Shots', 'Shots on target', 'Big chances missed'],
+        'Team Play': ['Assists', 'Passes', 'Crosses', 'Through balls'],
+        'Discipline': ['Yellow cards', 'Red cards', 'Fouls', 'Offsides'],
+        'Defence': ['Tackles', 'Blocked shots', 'Interceptions', 'Clearances'],
+    }
+    sections = ''.join(
+        f'<li class="player-stats__stat"><div class="player-stats__stat-title">{category}</div>'
+        + ''.join(
+            f'<div class="player-stats__stat-value">{name}'
+            f'<span class="allStatContainer">{(player_id * (len(name) + j)) % 250}</span></div>'
+            for j, name in enumerate(names)
+        )
+        + '</li>'
+        for category, names in categories.items()
+    )
+    # Real pages carry a lot of navigation and promo markup around the parts we read
+    filler = '<nav><ul>' + '<li><a href="/news">Latest news</a></li>' * 400 + '</ul></nav>'
+    return (
+        f'<html><body>{filler}'
+        f'<section class="player-overview__side-widget"><div class="player-overview__col">'
+        f'<div class="player-overview__label">Position</div>'
+        f'<div class="player-overview__info">{position}</div></div></section>'
+        f'<img class="player-overview__flag-icon" src="/flags/ENG.png">'
+        f'<span class="player-overview__player-country">England</span>'
+        f'<div class="player-stats__top-stats">{top}</div>'
+        f'<ul class="player-stats__stats-wrapper">{sections}</ul>'
+        f'{filler}</body></html>'
+    )
+
+
+def generated_pages(clubs, players_per_club):
+    """A deterministic stand-in for the site: (kind, id) -> HTML."""
+    club_list = [(club_id, f"Club {club_id}") for club_id in range(1, clubs + 1)]
+    pages = {('clubs', None): club_index_page(club_list)}
+    for club_id, _ in club_list:
+        squad = [
+            (club_id * 1000 + number, f"Player {club_id} {number}", POSITIONS[number % len(POSITIONS)])
+            for number in range(players_per_club)
+        ]
+        pages[('squad', club_id)] = squad_page(squad)
+        for player_id, _, position in squad:
+            pages[('stats', player_id)] = player_stats_page(player_id, position)
+    return pages
+
+
+def recorded_pages():
+    """The newest stored snapshot of every club index, squad and stats page, as (kind, id) -> HTML."""
+    pages = {}
+    for url, snapshot in latest_snapshots(r'/clubs(/\d+/[^/]+/squad)?$|/players/\d+/[^/]+/stats$').items():
+        key = route(urlsplit(url).path)
+        if key:
+            pages[key] = read_blob(snapshot.digest)
+    return pages
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    pages = {}
+
+    def do_GET(self):
+        html = self.pages.get(route(urlsplit(self.path).path))
+        body = (html or 'Not found').encode('utf-8')
+        self.send_response(200 if html else 404)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(pages):
+    """Start a local HTTP server for `pages` in a background thread; returns the server."""
+    handler = type('Handler', (SiteHandler,), {'pages': pages})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(func, rounds):
+    """Call func() `rounds` times; per-call durations in milliseconds."""
+    durations = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - started) * 1000)
+    return durations
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark parsing, update_teams and the main views against a local copy of the site, in a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clubs', type=int, default=4, help='Clubs in the generated site')
+        parser.add_argument('--players', type=int, default=25, help='Players per club in the generated site')
+        parser.add_argument('--recorded', action='store_true',
+                            help='Serve the stored page snapshots instead of generated pages')
+        parser.add_argument('--rounds', type=int, default=20, help='Requests per view')
+        parser.add_argument('--output', default='benchmark.json', help='File the results are written to')
+        parser.add_argument('--baseline', help='Earlier results file to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Relative slowdown against the baseline that counts as a regression')
+
+    def handle(self, *args, **options):
+        # Snapshots are read from the real database, before switching to the test one
+        if options['recorded']:
+            pages = recorded_pages()
+            if ('clubs', None) not in pages:
+                raise CommandError("No recorded club index page; run update_teams with SNAPSHOTS_ENABLED first")
+        else:
+            pages = generated_pages(options['clubs'], options['players'])
+
+        metrics = {}
+        self.benchmark_parsing(pages, metrics)
+
+        server = serve(pages)
+        # Measured like production: no DEBUG query logging outside the captured requests
+        setup_test_environment(debug=False)
+        # A file, like production: the fetcher threads write the rate limiter's rows concurrently, and
+        # an in-memory database fails those writes with "table is locked" instead of waiting its turn
+        test_dir = tempfile.TemporaryDirectory()
+        connection.settings_dict['TEST']['NAME'] = f"{test_dir.name}/benchmark.sqlite3"
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                PREMIER_LEAGUE_URL=f"http://127.0.0.1:{server.server_address[1]}",
+                SCRAPER_SELENIUM_FALLBACK=False,
+                SNAPSHOTS_ENABLED=False,
+                # Measure the limiter's bookkeeping, not its waits: the local server can take any rate
+                SCRAPER_RATE_MAX=1_000_000,
+                SCRAPER_RATE_BURST=1_000_000,
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+            ):
+                self.benchmark_update(metrics)
+                self.benchmark_views(options['rounds'], metrics)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_dir.cleanup()
+            teardown_test_environment()
+            server.shutdown()
+
+        results = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'corpus': {
+                'source': 'recorded' if options['recorded'] else 'generated',
+                'pages': len(pages),
+            },
+            'metrics': metrics,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+        for name, value in sorted(metrics.items()):
+            self.stdout.write(f"  {name:<45} {value:12.2f}")
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['baseline']:
+            self.compare(options['baseline'], metrics, options['tolerance'])
+
+    def benchmark_parsing(self, pages, metrics):
+        stats_pages = [html for (kind, _), html in pages.items() if kind == 'stats']
+        if not stats_pages:
+            return
+        for backend, parse in PLAYER_PAGE_PARSERS.items():
+            started = time.perf_counter()
+            for html in stats_pages:
+                try:
+                    parse(html)
+                except Exception:
+                    # Broken recorded pages cost the same parse time and fail the same way in a scrape
+                    pass
+            metrics[f'parse.{backend}.pages_per_second'] = len(stats_pages) / (time.perf_counter() - started)
+
+    def benchmark_update(self, metrics):
+        started = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            # The stand-in pages link to no real images; don't reach out for the missing-photo one
+            call_command('update_teams', skip_images=True, stdout=StringIO(), stderr=StringIO())
+        metrics['update_teams.seconds'] = time.perf_counter() - started
+        metrics['update_teams.players'] = Player.objects.exclude(stats={}).count()
+
+    def benchmark_views(self, rounds, metrics):
+        player = Player.objects.exclude(stats={}).order_by('player_id').first()
+        team = Team.objects.filter(players__isnull=False).order_by('id').first()
+        if player is None or team is None:
+            raise CommandError("update_teams stored no players; is the site serving squad and stats pages?")
+
+        views = {
+            'player_detail': reverse('player_detail', args=[player.player_id, player.name.replace(' ', '-').lower()]),
+            'team_detail': reverse('team_detail', args=[team.id]),
+            'player_search': f"{reverse('player_search')}?q={player.name.split()[0][:4]}",
+        }
+
+        client = Client()
+        for name, url in views.items():
+            # The first request pays for building the search index and similar one-off work
+            with CaptureQueriesContext(connection) as queries:
+                cold = timed(lambda: client.get(url), 1)[0]
+            # Read before the next request: request_finished clears the connection's query log
+            cold_queries = len(queries)
+            durations = timed(lambda: client.get(url), rounds)
+
+            status = client.get(url).status_code
+            if status != 200:
+                raise CommandError(f"{name} answered {status} for {url}")
+
+            with CaptureQueriesContext(connection) as warm_queries:
+                client.get(url)
+
+            metrics[f'views.{name}.cold_ms'] = cold
+            metrics[f'views.{name}.cold_queries'] = cold_queries
+            metrics[f'views.{name}.median_ms'] = statistics.median(durations)
+            metrics[f'views.{name}.p95_ms'] = percentile(durations, 0.95)
+            metrics[f'views.{name}.queries'] = len(warm_queries)
+
+    def compare(self, baseline_file, metrics, tolerance):
+        with open(baseline_file) as f:
+            baseline = json.load(f)['metrics']
+
+        regressions = []
+        self.stdout.write(f"Compared with {baseline_file}:")
+        for name, value in sorted(metrics.items()):
+            before = baseline.get(name)
+            if not before:
+                continue
+            change = (value - before) / before
+            if name.endswith(HIGHER_IS_BETTER):
+                change = -change
+            self.stdout.write(f"  {name:<45} {before:12.2f} -> {value:12.2f}  {change:+.0%}")
+            # Query counts are exact, so any increase is a regression
+            if change > (0 if name.endswith('queries') else tolerance):
+                regressions.append(name)
+
+        if regressions:
+            raise CommandError(f"Regressions against {baseline_file}: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("No regressions"))
@@ -0,0 +1,82 @@
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from stats.models import Team, Player
+from stats.persistence import save_players_details, save_squad
+from stats.scrape import parse_player_page, parse_squad_page
+from stats.snapshots import latest_snapshots, read_blob
+
+
+SQUAD_URL = re.compile(r'/clubs/(\d+)/[^/]+/squad$')
+PLAYER_STATS_URL = re.compile(r'/players/(\d+)/[^/]+/stats$')
+
+
+def parse_squad_snapshot(digest):
+    return parse_squad_page(read_blob(digest))
+
+
+def parse_player_snapshot(digest, player_name):
+    return parse_player_page(read_blob(digest), player_name)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild squads and player details and stats from the stored page snapshots, without network access'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of processes decompressing and parsing snapshots')
+        parser.add_argument('--players', type=int, nargs='*',
+                            help='Only re-parse these player ids (default: every player with a snapshot)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        workers = max(1, options['workers'])
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            if not options['players']:
+                self.reparse_squads(executor)
+            self.reparse_players(executor, options['players'])
+
+        self.stdout.write(self.style.SUCCESS(f"Re-parsed snapshots in {time.monotonic() - started:.1f}s"))
+
+    def reparse_squads(self, executor):
+        teams = Team.objects.in_bulk()
+        snapshots = [
+            (teams[int(SQUAD_URL.search(url).group(1))], snapshot)
+            for url, snapshot in latest_snapshots(SQUAD_URL.pattern).items()
+            if int(SQUAD_URL.search(url).group(1)) in teams
+        ]
+
+        parsed = executor.map(parse_squad_snapshot, [snapshot.digest for _, snapshot in snapshots])
+        for (team, snapshot), cards in zip(snapshots, parsed):
+            if cards is None:
+                self.stdout.write(self.style.WARNING(f"No player cards in {snapshot.url}"))
+                continue
+            # Re-parsed pages are no newer than what is stored, so freshness is left as the last scrape set it
+            save_squad(team, cards, scraped=False)
+            self.stdout.write(f"{team.name}: {len(cards)} players from the {snapshot.fetched_at:%Y-%m-%d} snapshot")
+
+    def reparse_players(self, executor, player_ids=None):
+        players = Player.objects.in_bulk(player_ids) if player_ids else Player.objects.in_bulk()
+        snapshots = []
+        for url, snapshot in latest_snapshots(PLAYER_STATS_URL.pattern).items():
+            player = players.get(int(PLAYER_STATS_URL.search(url).group(1)))
+            if player:
+                snapshots.append((player, snapshot))
+
+        parsed = executor.map(
+            parse_player_snapshot,
+            [snapshot.digest for _, snapshot in snapshots],
+            [player.name for player, _ in snapshots],
+            chunksize=16,
+        )
+        changed = save_players_details(
+            {player: player_data for (player, _), player_data in zip(snapshots, parsed)}, scraped=False
+        )
+        self.stdout.write(f"Details and stats re-parsed for {len(snapshots)} players, {len(changed)} changed")
@@ -0,0 +1,96 @@
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from stats import jobs, metrics
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.render_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Run background scrape jobs queued by the views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker threads taking jobs from the queue')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty instead of polling for new jobs')
+        parser.add_argument('--metrics-port', type=int,
+                            help='Serve the scrape and job metrics of this worker process on this port')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.stop = threading.Event()
+        self.prune_lock = threading.Lock()
+        self.pruned_at = None
+        self.stdout.write(f"Starting {workers} scrape workers...")
+
+        if options['metrics_port']:
+            # Scrapes run here, not in the web process, so their metrics are exported from here
+            server = ThreadingHTTPServer(('', options['metrics_port']), MetricsHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.stdout.write(f"Serving metrics on port {options['metrics_port']}")
+
+        threads = [
+            threading.Thread(target=self.work, args=(f"{socket.gethostname()}:{os.getpid()}:{n}", options['burst']))
+            for n in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the running jobs finish...")
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS("Scrape workers stopped."))
+
+    def work(self, worker_id, burst):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = jobs.claim(worker_id)
+                if job is None:
+                    self.prune()
+                    if burst:
+                        return
+                    self.stop.wait(settings.SCRAPE_JOB_POLL_INTERVAL)
+                    continue
+
+                started = time.monotonic()
+                ok = jobs.run(job)
+                status = "done" if ok else job.status
+                self.stdout.write(f"[{worker_id}] {job.key}: {status} in {time.monotonic() - started:.1f}s")
+        finally:
+            connection.close()
+
+    def prune(self):
+        # One idle thread of the process deletes old finished jobs now and then
+        with self.prune_lock:
+            if self.pruned_at is not None and time.monotonic() - self.pruned_at < settings.SCRAPE_JOB_PRUNE_INTERVAL:
+                return
+            self.pruned_at = time.monotonic()
+        deleted = jobs.prune()
+        if deleted:
+            self.stdout.write(f"Deleted {deleted} finished jobs")
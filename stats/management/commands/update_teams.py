@@ -1,57 +1,147 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
 from django.core.management.base import BaseCommand
-from stats.models import Team, Player
-from stats.scrape import scrape_team_data, scrape_club_squad, scrape_player_data
+from django.utils import timezone
+from stats import images
+from stats.freshness import is_stale
+from stats.models import Team, UpdateRun, UpdateCheckpoint
+from stats.persistence import save_teams
+from stats.scrape import process_context, scrape_team_data, scrape_club_squad
+
+
+def checkpoint(run_id, kind, object_id, started, error=''):
+    UpdateCheckpoint.objects.update_or_create(
+        run_id=run_id,
+        kind=kind,
+        object_id=object_id,
+        defaults={
+            'completed_at': None if error else timezone.now(),
+            'duration': time.monotonic() - started,
+            'error': error,
+        }
+    )
+
+
+def update_club(run_id, team_data, parse_workers=None):
+    """Scrape one club's squad and player stats. Runs in the command process or in a worker."""
+    started = time.monotonic()
+    log = [f"Updating team: {team_data['name']}"]
+    failures = []
+
+    try:
+        save_teams([team_data])
+        team = Team.objects.get(id=team_data['id'])
+
+        # Step 3: Scrape the squad and the stats of the players that have none; an expired
+        # squad is scraped again, with the stats of its expired players
+        log.append(f"Updating squad for team: {team_data['name']}")
+        club_name = team_data['name'].replace(' ', '-').lower()
+        players_data = scrape_club_squad(team.id, club_name, refresh=is_stale(team), parse_workers=parse_workers)
+
+        if not players_data:
+            raise RuntimeError(f"Failed to retrieve player data for {team_data['name']}")
+
+        # Step 4: Every fetch was already retried with backoff, so players still without stats
+        # failed. The club stays unfinished, and a --resume run scrapes it again, which only
+        # fetches the stats of its players that have none
+        failures.extend(f"No stats scraped for {player['name']}" for player in players_data if not player['stats'])
+
+        checkpoint(run_id, UpdateCheckpoint.TEAM, team_data['id'], started, '\n'.join(failures))
+
+    except Exception as e:
+        failures.append(f"{team_data['name']}: {e}")
+        checkpoint(run_id, UpdateCheckpoint.TEAM, team_data['id'], started, str(e))
+
+    return {
+        'name': team_data['name'],
+        'duration': time.monotonic() - started,
+        'failures': failures,
+        'log': log,
+    }
+
 
 class Command(BaseCommand):
     help = 'Scrape and update teams and players data'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes updating clubs in parallel')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue the last unfinished run, skipping clubs and players already done')
+        parser.add_argument('--skip-images', action='store_true',
+                            help="Don't download new crests, player photos and flags for the image proxy")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        workers = max(1, options['workers'])
         self.stdout.write("Starting team and player data update...")
 
+        run = None
+        if options['resume']:
+            run = UpdateRun.objects.filter(finished_at__isnull=True).order_by('-started_at').first()
+            if run:
+                self.stdout.write(f"Resuming update run {run.pk} from {run.started_at}")
+            else:
+                self.stdout.write("No unfinished update run found, starting a new one")
+        if run is None:
+            run = UpdateRun.objects.create()
+
         # Step 1: Scrape all team data
         teams = scrape_team_data()
 
-        # Step 2: Update team data in the database
-        for team_data in teams:
-            self.stdout.write(f"Updating team: {team_data['name']}")
-            team, created = Team.objects.update_or_create(
-                id=team_data['id'],
-                defaults={
-                    'name': team_data['name'],
-                    'crest': team_data['logo']
-                }
-            )
-
-            # Step 3: Scrape the squad data for each team
-            self.stdout.write(f"Updating squad for team: {team_data['name']}")
-            club_name = team_data['name'].replace(' ', '-').lower()
-            players_data = scrape_club_squad(team_data['id'], club_name)
-
-            # Step 4: Update player data and scrape stats if necessary
-            if players_data:
-                for player_data in players_data:
-                    self.stdout.write(f"Updating player: {player_data['name']}")
-                    player, created = Player.objects.update_or_create(
-                        player_id=player_data['id'],
-                        team=team,
-                        defaults={
-                            'name': player_data['name'],
-                            'position': player_data['position'],
-                            'nationality': player_data['nationality'],
-                            'image': player_data['image'],
-                            'flag_image': player_data['flag_image'],
-                        }
-                    )
-
-                    # Step 5: If player has no stats, scrape the player's individual stats
-                    if not player.stats:
-                        self.stdout.write(f"Scraping stats for player: {player_data['name']}")
-                        player_stats = scrape_player_data(player.player_id, player.name)
-                        if player_stats:
-                            player.stats = player_stats['stats']
-                            player.save()
+        # Step 2: Skip the clubs already completed by this run
+        done = set(UpdateCheckpoint.objects.filter(
+            run=run, kind=UpdateCheckpoint.TEAM, completed_at__isnull=False
+        ).values_list('object_id', flat=True))
+        pending = [team_data for team_data in teams if int(team_data['id']) not in done]
+        if done:
+            self.stdout.write(f"Skipping {len(teams) - len(pending)} clubs completed earlier")
 
-            else:
-                self.stdout.write(f"Failed to retrieve player data for {team_data['name']}")
+        results = []
+        if workers == 1:
+            for team_data in pending:
+                results.append(self.report(update_club(run.pk, team_data)))
+        else:
+            # Workers are started fresh (see process_context), not forked with this process's
+            # database connections and keep-alive HTTP session. Parallelism comes from the
+            # clubs, so every worker parses its pages inline
+            with ProcessPoolExecutor(max_workers=workers, mp_context=process_context(),
+                                     initializer=django.setup) as executor:
+                futures = [executor.submit(update_club, run.pk, team_data, 1) for team_data in pending]
+                for future in as_completed(futures):
+                    results.append(self.report(future.result()))
+
+        # Step 5: Store the images the pages will show, so browsers get them from the image proxy
+        if not options['skip_images']:
+            stored = images.prefetch(images.scraped_image_urls())
+            self.stdout.write(f"Stored {stored} new images")
+
+        failures = [failure for result in results for failure in result['failures']]
+        if not failures:
+            run.finished_at = timezone.now()
+            run.save()
+
+        self.stdout.write("")
+        self.stdout.write(f"Update run {run.pk} summary:")
+        for result in sorted(results, key=lambda result: -result['duration']):
+            status = f"{len(result['failures'])} failures" if result['failures'] else "ok"
+            self.stdout.write(f"  {result['name']:<30} {result['duration']:7.1f}s  {status}")
+        self.stdout.write(f"{len(results)} clubs updated in {time.monotonic() - started:.1f}s")
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(f"  {failure}")
+            self.stdout.write(self.style.WARNING(
+                f"Finished with {len(failures)} failures; run again with --resume to retry them."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Successfully updated team and player data."))
 
-        self.stdout.write(self.style.SUCCESS("Successfully updated team and player data."))
+    def report(self, result):
+        for line in result['log']:
+            self.stdout.write(line)
+        for failure in result['failures']:
+            self.stdout.write(self.style.ERROR(failure))
+        return result
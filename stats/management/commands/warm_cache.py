@@ -0,0 +1,47 @@
+import time
+from itertools import groupby
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max
+from stats import caching
+from stats.models import Team, Player
+
+
+class Command(BaseCommand):
+    help = 'Fill the shared cache from the database, so freshly started processes serve pages without scraping'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        teams = list(Team.objects.order_by('name'))
+        entries = [caching.team_entry(team) for team in teams]
+        # The club list update_teams and the teams job would otherwise scrape again
+        cache.set(caching.cache_key(caching.TEAMS, 'scraped'), entries, 60 * 60 * 24)
+        latest = Team.objects.aggregate(updated_at=Max('updated_at'), count=Count('id'))
+        if latest['updated_at']:
+            etag = caching.teams_etag(latest['updated_at'], latest['count'])
+            cache.set(caching.cache_key(caching.TEAMS, 'saved', etag), entries)
+
+        # Keyed like the views key them, by the ETag of the team and the version of the player
+        teams_by_id = {team.id: team for team in teams if team.version}
+        squads = {}
+        players = {}
+        rows = Player.objects.filter(team__isnull=False).order_by('team_id', 'pk')
+        for team_id, squad in groupby(rows.iterator(), key=lambda player: player.team_id):
+            squad = list(squad)
+            team = teams_by_id.get(team_id)
+            if team:
+                etag = caching.team_etag(team.version, team.updated_at)
+                squads[caching.cache_key(caching.SQUAD, team_id, etag)] = caching.squad_entry(team, squad)
+            for player in squad:
+                if player.stats and player.version:
+                    players[caching.cache_key(caching.PLAYER, player.pk, player.version)] = caching.player_entry(player)
+
+        cache.set_many(squads)
+        cache.set_many(players)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Cached {len(entries)} teams, {len(squads)} squads and {len(players)} players "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
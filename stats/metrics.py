@@ -0,0 +1,163 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+
+# Upper bounds in seconds; wide because a Selenium page load and a cached query both land here
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(label, '') for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> (count per bucket with +Inf last, sum)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(label, '') for label in self.labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts), total) for key, (counts, total) in self._values.items())
+        for key, counts, total in values:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, 'le': str(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+function_seconds = Histogram(
+    'stats_function_seconds', 'Time spent in instrumented scraping and parsing functions', ('function',)
+)
+request_seconds = Histogram('stats_request_seconds', 'Request handling time per view', ('view',))
+requests_total = Counter('stats_requests_total', 'Requests per view and status code', ('view', 'status'))
+db_queries_total = Counter('stats_db_queries_total', 'Database queries run while handling requests', ('view',))
+db_seconds_total = Counter('stats_db_seconds_total', 'Time spent in database queries while handling requests', ('view',))
+render_seconds = Histogram('stats_render_seconds', 'Template rendering time', ('template',))
+job_seconds = Histogram('stats_job_seconds', 'Scrape job run time by kind and outcome', ('kind', 'status'))
+cache_requests_total = Counter('stats_cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+upstream_requests_total = Counter(
+    'stats_upstream_requests_total', 'Upstream fetches by host and status code (error: no response)', ('host', 'status')
+)
+upstream_retries_total = Counter('stats_upstream_retries_total', 'Upstream fetches retried after backing off', ('host',))
+upstream_rejected_total = Counter(
+    'stats_upstream_rejected_total', 'Upstream fetches not sent because the host\'s circuit was open', ('host',)
+)
+
+REGISTRY = [
+    function_seconds, request_seconds, requests_total, db_queries_total,
+    db_seconds_total, render_seconds, job_seconds, cache_requests_total,
+    upstream_requests_total, upstream_retries_total, upstream_rejected_total,
+]
+
+# Time per Server-Timing category ('db', 'fetch', 'parse', ...) of the request being handled, if any
+request_timings = ContextVar('request_timings', default=None)
+
+
+# Query count and time of the request being handled, if any. A context variable, not the
+# connection: async views run their queries on other threads, which have their own connections
+request_queries = ContextVar('request_queries', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    record = request_queries.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record['queries'] += 1
+        record['db_seconds'] += time.perf_counter() - started
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """connection_created receiver: count the queries of every connection, whichever thread opens it."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def add_timing(category, seconds):
+    timings = request_timings.get()
+    if timings is not None:
+        timings[category] = timings.get(category, 0) + seconds
+
+
+@contextmanager
+def timer(histogram, category=None, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        if category:
+            add_timing(category, elapsed)
+
+
+def instrumented(category):
+    """Record every call of the decorated function in stats_function_seconds, and under `category` in Server-Timing."""
+    def decorator(func):
+        name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(function_seconds, category, function=name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_lookup(cache_name, hit):
+    cache_requests_total.inc(cache=cache_name, result='hit' if hit else 'miss')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_sample(name, labels, value):
+    label_text = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels.items())
+    return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+
+def render_text():
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {'histogram' if isinstance(metric, Histogram) else 'counter'}")
+        lines.extend(_format_sample(*sample) for sample in metric.samples())
+    return '\n'.join(lines) + '\n'
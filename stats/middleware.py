@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Record time, status and database work per view, and optionally send them back as Server-Timing.
+
+    Queries are counted by metrics.count_query, an execute_wrapper installed on every connection
+    as it is opened, so they cost nothing extra when DEBUG is off and are counted on whichever
+    thread runs them. The timings of instrumented scraping and rendering code that ran during
+    the request come from metrics.request_timings.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with self.measure(request) as record:
+            record['response'] = self.get_response(request)
+        return self.finish(request, record)
+
+    async def __acall__(self, request):
+        with self.measure(request) as record:
+            record['response'] = await self.get_response(request)
+        return self.finish(request, record)
+
+    @contextmanager
+    def measure(self, request):
+        record = {'timings': {}, 'queries': 0, 'db_seconds': 0.0}
+
+        # Both context variables reach the sync_to_async threads that run an async view's queries
+        timings_token = metrics.request_timings.set(record['timings'])
+        queries_token = metrics.request_queries.set(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            metrics.request_queries.reset(queries_token)
+            metrics.request_timings.reset(timings_token)
+            record['elapsed'] = time.perf_counter() - started
+
+    def finish(self, request, record):
+        response = record['response']
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        metrics.request_seconds.observe(record['elapsed'], view=view)
+        metrics.requests_total.inc(view=view, status=str(response.status_code))
+        metrics.db_queries_total.inc(record['queries'], view=view)
+        metrics.db_seconds_total.inc(record['db_seconds'], view=view)
+
+        if settings.METRICS_SERVER_TIMING:
+            timings = {**record['timings'], 'db': record['db_seconds'], 'total': record['elapsed']}
+            response['Server-Timing'] = ', '.join(
+                f"{name};dur={seconds * 1000:.1f}" + (f';desc="{record["queries"]} queries"' if name == 'db' else '')
+                for name, seconds in timings.items()
+            )
+        return response
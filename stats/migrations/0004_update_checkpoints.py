@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0003_player_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UpdateRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UpdateCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('team', 'Team'), ('player', 'Player')], max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='stats.updaterun')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'kind', 'object_id'), name='unique_update_checkpoint')],
+            },
+        ),
+    ]
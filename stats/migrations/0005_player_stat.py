@@ -0,0 +1,56 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_player_stats(apps, schema_editor):
+    Player = apps.get_model('stats', 'Player')
+    PlayerStat = apps.get_model('stats', 'PlayerStat')
+
+    rows = []
+    for player in Player.objects.exclude(stats=None).iterator():
+        stats = player.stats
+        if not isinstance(stats, dict):
+            continue
+        # Older squad scrapes stored the whole scrape_player_data() dict
+        if isinstance(stats.get('stats'), dict):
+            stats = stats['stats']
+
+        for key, value in stats.items():
+            try:
+                number = float(str(value).replace(',', '').replace('%', '').strip())
+            except ValueError:
+                continue
+            category, separator, name = key.partition(' - ')
+            if not separator:
+                category, name = '', key
+            rows.append(PlayerStat(player=player, category=category, name=name, value=number))
+
+    PlayerStat.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0004_update_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('name', models.CharField(max_length=100)),
+                ('value', models.FloatField()),
+                ('season', models.CharField(default='all', max_length=20)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stat_values', to='stats.player')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'name', 'season', '-value'], name='player_stat_ranking')],
+                'constraints': [models.UniqueConstraint(fields=('player', 'season', 'category', 'name'), name='unique_player_stat')],
+            },
+        ),
+        migrations.RunPython(backfill_player_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0005_player_stat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='last_scraped_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='last_scraped_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
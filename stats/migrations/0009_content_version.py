@@ -0,0 +1,63 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:46
+
+import hashlib
+import json
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def content_version(*values):
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def backfill_versions(apps, schema_editor):
+    Team = apps.get_model('stats', 'Team')
+    Player = apps.get_model('stats', 'Player')
+    now = timezone.now()
+
+    teams = list(Team.objects.all())
+    for team in teams:
+        team.version = content_version(team.name, team.crest)
+        team.updated_at = now
+    Team.objects.bulk_update(teams, ['version', 'updated_at'])
+
+    players = list(Player.objects.all())
+    for player in players:
+        player.version = content_version(
+            player.team_id, player.name, player.position, player.nationality,
+            player.flag_image, player.image, player.stats,
+        )
+        player.updated_at = now
+    Player.objects.bulk_update(players, ['version', 'updated_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0008_scrape_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='version',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='version',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0009_content_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500)),
+                ('digest', models.CharField(max_length=64)),
+                ('size', models.IntegerField()),
+                ('fetched_at', models.DateTimeField()),
+                ('last_seen_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['url', '-fetched_at'], name='page_snapshot_latest')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def index_players(apps, schema_editor):
+    from stats.search import normalize
+
+    Player = apps.get_model('stats', 'Player')
+    rows = [
+        (player.pk, normalize(player.name), normalize(player.team.name),
+         normalize(player.position), normalize(player.nationality))
+        for player in Player.objects.select_related('team')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO stats_player_search (rowid, name, team, position, nationality) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+        cursor.executemany(
+            "INSERT INTO stats_player_trigrams (rowid, text) VALUES (%s, %s)",
+            [(row[0], ' '.join(part for part in row[1:] if part)) for row in rows],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0010_page_snapshot'),
+    ]
+
+    operations = [
+        # Text is stored already normalized (see stats.search.normalize), which also folds letters
+        # like 'ø' that unicode61's remove_diacritics leaves alone
+        migrations.RunSQL(
+            "CREATE VIRTUAL TABLE stats_player_search USING fts5("
+            "name, team, position, nationality, tokenize = 'unicode61', prefix = '2 3')",
+            "DROP TABLE stats_player_search",
+        ),
+        migrations.RunSQL(
+            "CREATE VIRTUAL TABLE stats_player_trigrams USING fts5(text, tokenize = 'trigram')",
+            "DROP TABLE stats_player_trigrams",
+        ),
+        migrations.RunPython(index_players, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0011_player_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('team', 'Team'), ('player', 'Player')], max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('version', models.CharField(blank=True, default='', max_length=40)),
+                ('data', models.JSONField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0012_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HostThrottle',
+            fields=[
+                ('host', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('rate', models.FloatField()),
+                ('tokens', models.FloatField()),
+                ('refilled_at', models.DateTimeField()),
+                ('failures', models.IntegerField(default=0)),
+                ('open_until', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stats', '0013_host_throttle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageAsset',
+            fields=[
+                ('url', models.URLField(max_length=500, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=80)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
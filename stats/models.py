@@ -1,9 +1,34 @@
+import hashlib
+import json
+
 from django.db import models
 
+
+def content_version(*values):
+    """A stable hash of scraped values, used as the HTTP validator of the page showing them."""
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
 class Team(models.Model):
     id = models.IntegerField(primary_key=True)
     name = models.CharField(max_length=100)
     crest = models.URLField(null=True, blank=True)
+    # Freshness of the squad (see stats/freshness.py)
+    last_scraped_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Content version: `version` hashes the team's fields, `updated_at` also moves when the squad changes
+    version = models.CharField(max_length=40, blank=True, default='')
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    # What the club index shows, hashed into `version` and logged with every change
+    CONTENT_FIELDS = ['name', 'crest']
+
+    def content(self):
+        return {field: getattr(self, field) for field in self.CONTENT_FIELDS}
+
+    def compute_version(self):
+        return content_version(*self.content().values())
+
 
 class Player(models.Model):
     player_id = models.IntegerField(primary_key=True)
@@ -13,4 +38,213 @@ class Player(models.Model):
     nationality = models.CharField(max_length=50)
     flag_image = models.URLField(null=True, max_length=500)  # Add this field
     stats = models.JSONField(null=True, blank=True)  # Add this for player stats
-    image = models.URLField(null=True, blank=True)
\ No newline at end of file
+    image = models.URLField(null=True, blank=True)
+    # Freshness of the details and stats (see stats/freshness.py)
+    last_scraped_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Content version: hash of everything the player page shows, and when it last changed
+    version = models.CharField(max_length=40, blank=True, default='')
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    CONTENT_FIELDS = ['team_id', 'name', 'position', 'nationality', 'flag_image', 'image', 'stats']
+
+    def content(self):
+        return {field: getattr(self, field) for field in self.CONTENT_FIELDS}
+
+    def compute_version(self):
+        return content_version(*self.content().values())
+
+
+class Change(models.Model):
+    """
+    An append-only log of content changes to teams and players, written in the same transaction
+    as the change. Ids only grow, so the last one a client has seen is its /api/changes/ cursor.
+    """
+    TEAM = 'team'
+    PLAYER = 'player'
+    KIND_CHOICES = [(TEAM, 'Team'), (PLAYER, 'Player')]
+
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = [(CREATED, 'Created'), (UPDATED, 'Updated'), (DELETED, 'Deleted')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    version = models.CharField(max_length=40, blank=True, default='')
+    data = models.JSONField(null=True, blank=True)  # the record's content() after the change; None when deleted
+    changed_at = models.DateTimeField()
+
+    @classmethod
+    def of(cls, obj, action, now):
+        deleted = action == cls.DELETED
+        return cls(
+            kind=cls.TEAM if isinstance(obj, Team) else cls.PLAYER, object_id=obj.pk, action=action,
+            version='' if deleted else obj.version, data=None if deleted else obj.content(), changed_at=now,
+        )
+
+
+class UpdateRun(models.Model):
+    """One execution of the update_teams command; unfinished runs can be resumed."""
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class UpdateCheckpoint(models.Model):
+    TEAM = 'team'
+    PLAYER = 'player'
+    KIND_CHOICES = [(TEAM, 'Team'), (PLAYER, 'Player')]
+
+    run = models.ForeignKey(UpdateRun, related_name='checkpoints', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)  # seconds
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'kind', 'object_id'], name='unique_update_checkpoint'),
+        ]
+
+
+def split_stat_key(key):
+    """'Attack - Goals' -> ('Attack', 'Goals'); top stats like 'Appearances' have no category."""
+    category, separator, name = key.partition(' - ')
+    return (category, name) if separator else ('', key)
+
+
+def parse_stat_value(value):
+    """Scraped stat strings ('1,234', '45%', '0.35') as numbers; None if not numeric."""
+    try:
+        return float(str(value).replace(',', '').replace('%', '').strip())
+    except ValueError:
+        return None
+
+
+def stat_values(stats):
+    """The numeric entries of a Player.stats dict, keyed like the dict."""
+    values = {}
+    for key, value in (stats or {}).items():
+        number = parse_stat_value(value)
+        if number is not None:
+            values[key] = number
+    return values
+
+
+class PlayerStatQuerySet(models.QuerySet):
+    def for_stat(self, key, season=None):
+        category, name = split_stat_key(key)
+        return self.filter(category=category, name=name, season=season or PlayerStat.ALL_SEASONS)
+
+    def top(self, key, position=None, team=None, limit=10, season=None):
+        """Highest values of one stat, e.g. PlayerStat.objects.top('Attack - Goals', position='defender')."""
+        stats = self.for_stat(key, season).select_related('player__team').defer('player__stats')
+        if position:
+            stats = stats.filter(player__position__iexact=position)
+        if team:
+            stats = stats.filter(player__team=team)
+        return stats.order_by('-value', 'player_id')[:limit]
+
+
+class PlayerStat(models.Model):
+    # The stats pages show career totals unless a season is picked
+    ALL_SEASONS = 'all'
+
+    player = models.ForeignKey(Player, related_name='stat_values', on_delete=models.CASCADE)
+    category = models.CharField(max_length=50, blank=True)  # '' for the top stats (Appearances, Wins, ...)
+    name = models.CharField(max_length=100)
+    value = models.FloatField()
+    season = models.CharField(max_length=20, default=ALL_SEASONS)
+
+    objects = PlayerStatQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['player', 'season', 'category', 'name'], name='unique_player_stat'),
+        ]
+        indexes = [
+            # Rankings: one stat, ordered by value
+            models.Index(fields=['category', 'name', 'season', '-value'], name='player_stat_ranking'),
+        ]
+
+    @property
+    def key(self):
+        return f"{self.category} - {self.name}" if self.category else self.name
+
+
+class ScrapeJob(models.Model):
+    """A unit of background scraping, run by `manage.py scrape_worker` (see stats/jobs.py)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=20)
+    key = models.CharField(max_length=200)  # identifies the work, e.g. 'player:4328'
+    args = models.JSONField(default=list)
+    priority = models.IntegerField(default=0)  # higher runs first
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    result = models.JSONField(null=True, blank=True)  # what the handler returned
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # At most one queued or running job per key
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='unique_active_scrape_job',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after'], name='scrape_job_queue'),
+        ]
+
+
+class ScrapeLock(models.Model):
+    """Cross-process single-flight lock for one scrape key (see stats/singleflight.py)."""
+    key = models.CharField(max_length=200, primary_key=True)
+    owner = models.CharField(max_length=100, blank=True, default='')  # '' when nobody holds it
+    expires_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)  # what the last holder's scrape returned
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class HostThrottle(models.Model):
+    """Rate limiter and circuit breaker state shared by every scraper of one upstream host (see stats/throttle.py)."""
+    host = models.CharField(max_length=200, primary_key=True)
+    rate = models.FloatField()  # requests per second, adapted to how the host responds
+    tokens = models.FloatField()
+    refilled_at = models.DateTimeField()
+    failures = models.IntegerField(default=0)  # consecutive failed, rate-limited or 5xx responses
+    open_until = models.DateTimeField(null=True, blank=True)  # the circuit is open (no requests) until then
+
+
+class ImageAsset(models.Model):
+    """An upstream image stored by the image proxy; the file is IMAGE_DIR/<size>/<name> (see stats/images.py)."""
+    url = models.URLField(max_length=500, primary_key=True)
+    name = models.CharField(max_length=80)  # <sha256 of the bytes>.<extension>
+    fetched_at = models.DateTimeField()
+
+
+class PageSnapshot(models.Model):
+    """A fetched upstream page; the compressed HTML lives in the snapshot store under `digest`."""
+    url = models.URLField(max_length=500)
+    digest = models.CharField(max_length=64)  # sha256 of the HTML
+    size = models.IntegerField()  # uncompressed bytes
+    fetched_at = models.DateTimeField()  # first fetch with this content
+    last_seen_at = models.DateTimeField()  # latest fetch with this content
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['url', '-fetched_at'], name='page_snapshot_latest'),
+        ]
@@ -0,0 +1,267 @@
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import caching
+from .freshness import mark_scraped
+from .models import Change, Team, Player, PlayerStat, split_stat_key, stat_values
+
+
+# Fields a squad page provides for each player
+SQUAD_FIELDS = ['name', 'position', 'nationality', 'flag_image', 'image']
+
+# Fields a player stats page provides (see scrape.parse_player_page)
+DETAILS_FIELDS = ['name', 'position', 'nationality', 'flag_image', 'stats']
+
+# Written with every content change so the views can answer conditional requests
+VERSION_FIELDS = ['version', 'updated_at']
+
+# Written with every scrape, whether or not the content changed
+FRESHNESS_FIELDS = ['last_scraped_at', 'expires_at']
+
+# bulk_create/bulk_update don't send post_save, so listeners (the search index) get this instead
+players_saved = Signal()
+# Likewise for clubs created or changed by save_teams (renames reach the search index)
+teams_saved = Signal()
+# Sent after the PlayerStat rows of `players` have been rewritten (the leaderboards listen)
+player_stats_saved = Signal()
+
+
+def normalize_position(position):
+    # Squad cards say 'Forward' and player pages 'forward'; one spelling keeps re-scrapes from being changes
+    return (position or '').strip().capitalize()
+
+
+def touch(obj, now=None):
+    """Refresh the content version of a Team or Player; True if its content changed."""
+    version = obj.compute_version()
+    if version == obj.version:
+        return False
+    obj.version = version
+    obj.updated_at = now or timezone.now()
+    return True
+
+
+def forget_validators(teams=(), players=()):
+    """Once the transaction commits, drop the cached ETag rows of the written teams and players."""
+    team_ids = [team.pk for team in teams]
+    player_ids = [player.pk for player in players]
+
+    def forget():
+        caching.forget_validators(caching.PLAYER, player_ids)
+        if team_ids:
+            caching.forget_validators(caching.SQUAD, team_ids)
+            # The club list's ETag comes from every team's updated_at
+            caching.forget_validators(caching.TEAMS, ['all'])
+
+    transaction.on_commit(forget)
+
+
+def touch_squads(team_ids, now):
+    """The squad pages of `team_ids` show a player whose card changed: move their ETags too."""
+    team_ids = list(team_ids)
+    if team_ids:
+        Team.objects.filter(pk__in=team_ids).update(updated_at=now)
+        forget_validators(teams=[Team(pk=team_id) for team_id in team_ids])
+
+
+def log_changes(created=(), updated=(), now=None):
+    """Append Change rows for the given Teams/Players; call inside the transaction that wrote them."""
+    now = now or timezone.now()
+    Change.objects.bulk_create(
+        [Change.of(obj, Change.CREATED, now) for obj in created] +
+        [Change.of(obj, Change.UPDATED, now) for obj in updated]
+    )
+
+
+def save_teams(teams):
+    """Create or update the scraped clubs (dicts with id/name/logo) in a constant number of queries."""
+    scraped = {int(team['id']): team for team in teams}
+
+    with transaction.atomic():
+        existing = Team.objects.in_bulk(list(scraped))
+        to_create, to_update = [], []
+        for team_id, team_data in scraped.items():
+            team = existing.get(team_id)
+            if team is None:
+                team = Team(id=team_id, name=team_data['name'], crest=team_data['logo'])
+                touch(team)
+                to_create.append(team)
+            else:
+                team.name = team_data['name']
+                team.crest = team_data['logo']
+                if touch(team):
+                    to_update.append(team)
+
+        Team.objects.bulk_create(to_create)
+        Team.objects.bulk_update(to_update, ['name', 'crest'] + VERSION_FIELDS)
+        log_changes(to_create, to_update)
+        forget_validators(teams=to_create + to_update)
+
+    if to_update:
+        teams_saved.send(sender=Team, teams=to_update)
+    return to_create + to_update
+
+
+def save_squad(team, cards, scraped=True):
+    """
+    Diff the scraped squad cards of `team` against the database and write only the changes.
+
+    `cards` is the whole squad. One read loads the existing rows; new players are inserted with
+    bulk_create, changed ones (including players who moved from another club) written with
+    bulk_update, and players without a card, who left the club, are deleted, all in one
+    transaction. Returns the Player objects for every card, in card order. With scraped=False
+    (cards re-parsed from a snapshot) the team's freshness is left alone.
+    """
+    squad = {int(card['player_id']): {**card, 'position': normalize_position(card['position'])} for card in cards}
+
+    with transaction.atomic():
+        existing = Player.objects.in_bulk(list(squad))
+        players, to_create, to_update = [], [], []
+        previous_teams = set()
+        now = timezone.now()
+
+        for player_id, card in squad.items():
+            player = existing.get(player_id)
+            if player is None:
+                player = Player(player_id=player_id, team=team, **{field: card[field] for field in SQUAD_FIELDS})
+                touch(player, now)
+                to_create.append(player)
+            else:
+                if player.team_id != team.pk:
+                    previous_teams.add(player.team_id)
+                for field in SQUAD_FIELDS:
+                    setattr(player, field, card[field])
+                player.team = team
+                if touch(player, now):
+                    to_update.append(player)
+            players.append(player)
+
+        Player.objects.bulk_create(to_create)
+        Player.objects.bulk_update(to_update, SQUAD_FIELDS + ['team'] + VERSION_FIELDS)
+        log_changes(to_create, to_update, now)
+        # The clubs that players moved from no longer show them
+        touch_squads(previous_teams, now)
+
+        # Players without a card left the club. The post_delete receivers log a 'deleted' Change
+        # and take them out of search; no cards at all is a failed scrape, not an empty squad
+        removed = 0
+        if squad:
+            departed = Player.objects.filter(team=team).exclude(pk__in=list(squad))
+            removed = departed.delete()[1].get(Player._meta.label, 0)
+
+        # The team's freshness is that of its squad, and its page changes with the squad
+        update_fields = []
+        if scraped:
+            mark_scraped(team, 'team', now)
+            update_fields += FRESHNESS_FIELDS
+        if to_create or to_update or removed or touch(team, now):
+            team.updated_at = now
+            update_fields += VERSION_FIELDS
+        if update_fields:
+            team.save(update_fields=update_fields)
+        forget_validators(teams=[team], players=to_create + to_update)
+
+    if to_create or to_update:
+        players_saved.send(sender=Player, players=to_create + to_update)
+    return players
+
+
+def save_player_stats(players_data):
+    """Store scraped stats; `players_data` maps Player objects to scrape_player_data() results."""
+    scraped, changed = [], []
+    now = timezone.now()
+    for player, player_data in players_data.items():
+        if not player_data:
+            continue
+        mark_scraped(player, 'player', now)
+        scraped.append(player)
+        if player_data['stats'] != player.stats:
+            player.stats = player_data['stats']
+            touch(player, now)
+            changed.append(player)
+
+    # Unchanged players only get their freshness written
+    unchanged = [player for player in scraped if player not in changed]
+    with transaction.atomic():
+        Player.objects.bulk_update(unchanged, FRESHNESS_FIELDS)
+        Player.objects.bulk_update(changed, ['stats'] + FRESHNESS_FIELDS + VERSION_FIELDS)
+        save_stat_rows(changed)
+        log_changes(updated=changed, now=now)
+        # Freshness counts too: the validators decide when to queue a refresh
+        forget_validators(players=scraped)
+    return changed
+
+
+def save_player_details(player, player_data):
+    """Store a scrape_player_data() result on an existing player, keeping its image."""
+    save_players_details({player: player_data})
+
+
+def save_players_details(players_data, scraped=True):
+    """
+    Store scrape_player_data() results (`players_data` maps Player objects to them) on existing
+    players, in one transaction. With scraped=False (pages re-parsed from snapshots) freshness
+    is left alone, so the next real refresh still happens when it is due. Returns the players
+    whose content changed.
+    """
+    now = timezone.now()
+    written, changed, stats_changed, squads = [], [], [], set()
+    for player, player_data in players_data.items():
+        if not player_data:
+            continue
+        card = [getattr(player, field) for field in SQUAD_FIELDS]
+        if player_data['stats'] != player.stats:
+            stats_changed.append(player)
+
+        player.name = player_data['name']
+        player.position = normalize_position(player_data['position'])
+        player.nationality = player_data.get('nationality', player.nationality)
+        player.flag_image = player_data.get('flag_image', player.flag_image)
+        player.stats = player_data['stats']
+        if scraped:
+            mark_scraped(player, 'player', now)
+        written.append(player)
+
+        if touch(player, now):
+            changed.append(player)
+            # The team page's ETag comes from the team, so a changed player card has to move it
+            if [getattr(player, field) for field in SQUAD_FIELDS] != card:
+                squads.add(player.team_id)
+
+    changed_ids = {player.pk for player in changed}
+    freshness = FRESHNESS_FIELDS if scraped else []
+    with transaction.atomic():
+        if freshness:
+            # Unchanged players only get their freshness written
+            Player.objects.bulk_update([player for player in written if player.pk not in changed_ids], freshness)
+        Player.objects.bulk_update(changed, DETAILS_FIELDS + freshness + VERSION_FIELDS)
+        save_stat_rows(stats_changed)
+        log_changes(updated=changed, now=now)
+        touch_squads(squads, now)
+        # Freshness counts too: the validators decide when to queue a refresh
+        forget_validators(players=written if scraped else changed)
+
+    if changed:
+        # The listeners describe players by team name: one query for all of them
+        prefetch_related_objects(changed, 'team')
+        players_saved.send(sender=Player, players=changed)
+    return changed
+
+
+def save_stat_rows(players):
+    """Rewrite the typed PlayerStat rows of `players` from their `stats` JSON."""
+    if not players:
+        return
+
+    rows = []
+    for player in players:
+        for key, number in stat_values(player.stats).items():
+            category, name = split_stat_key(key)
+            rows.append(PlayerStat(player=player, category=category, name=name, value=number))
+
+    with transaction.atomic():
+        PlayerStat.objects.filter(player__in=players, season=PlayerStat.ALL_SEASONS).delete()
+        PlayerStat.objects.bulk_create(rows)
+        transaction.on_commit(lambda: player_stats_saved.send(sender=Player, players=players))
@@ -1,19 +1,40 @@
 from .models import Team, Player
 
+from django.conf import settings
 from django.core.cache import cache
-import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import lxml.html
+from lxml import etree
+import multiprocessing
+import threading
 import urllib.parse
-
-
-def scrape_club_squad(club_id, club_name):
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import django
+from .caching import TEAMS, cache_key
+from .freshness import is_stale, ttl
+from .metrics import cache_lookup, instrumented
+from .singleflight import single_flight
+from .snapshots import save_snapshot
+from . import throttle, upstream
+from .persistence import save_player_details, save_player_stats, save_squad, save_teams
+
+
+def site_url(path):
+    # PREMIER_LEAGUE_URL can point the scrapers at a local copy of the site (manage.py benchmark)
+    return f"{settings.PREMIER_LEAGUE_URL}{path}"
+
+
+@instrumented('scrape')
+def scrape_club_squad(club_id, club_name, refresh=False, parse_workers=None):
+    # Concurrent scrapes of the same squad (workers, update_teams) wait for the first one and re-read its rows
+    return single_flight(
+        f"squad:{club_id}", update_club_squad, club_id, club_name, refresh, parse_workers,
+        reuse=lambda: list(Player.objects.filter(team_id=club_id).values()),
+    )
+
+
+@instrumented('scrape')
+def update_club_squad(club_id, club_name, refresh=False, parse_workers=None):
     # Ensure the team exists in the database, or create it if necessary
     team, created = Team.objects.get_or_create(id=club_id, defaults={'name': club_name.replace('-', ' ')})
 
@@ -21,33 +42,109 @@ def scrape_club_squad(club_id, club_name):
     players_in_db = Player.objects.filter(team=team)
 
     # If all players have stats in the database, return the current data without scraping
-    if all(player.stats for player in players_in_db):
+    if not refresh and players_in_db and all(player.stats for player in players_in_db):
         print(f"Returning players data from the database for team {team.name}")
         return list(players_in_db.values())  # Return the players if their stats exist in the database
 
-    # Proceed with scraping if stats are missing or no players are found
+    # Proceed with scraping if stats are missing, no players are found or the squad is being refreshed
     print(f"Scraping players data for team {team.name}")
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    cards = scrape_squad_cards(club_id, club_name)
 
-    base_url = f"https://www.premierleague.com/clubs/{club_id}/{club_name}/squad"
-    driver.get(base_url)
+    # Write the whole squad (only what changed; players who left are removed), then the
+    # missing (or, on refresh, expired) stats, in a constant number of queries
+    players = save_squad(team, cards)
+    missing_stats = [player for player in players if not player.stats or (refresh and is_stale(player))]
+    scraped = scrape_players_data(
+        ((player.player_id, player.name) for player in missing_stats), parse_workers=parse_workers
+    )
+    save_player_stats({player: scraped[player.player_id] for player in missing_stats})
 
-    try:
+    # Return the updated list of players from the database
+    return list(Player.objects.filter(team=team).values())
+
+
+def squad_url(club_id, club_name):
+    return site_url(f"/clubs/{club_id}/{club_name}/squad")
+
+
+@instrumented('scrape')
+def scrape_squad_cards(club_id, club_name):
+    """Read the player cards of a club's squad page, from the static HTML when possible."""
+    html = fetch_page(squad_url(club_id, club_name))
+    cards = parse_squad_page(html) if html else None
+    if cards is not None:
+        return cards
+
+    if not settings.SCRAPER_SELENIUM_FALLBACK:
+        print(f"No player cards in the static squad page of {club_name}")
+        return []
+
+    print(f"Falling back to Selenium for the squad page of {club_name}")
+    return scrape_squad_cards_selenium(club_id, club_name)
+
+
+@instrumented('parse')
+def parse_squad_page(html):
+    """Extract the stats cards from squad page HTML; None if the markup lacks them."""
+    doc = lxml.html.fromstring(html)
+    card_elements = doc.find_class('stats-card')
+    if not card_elements:
+        return None
+
+    cards = []
+    for card_element in card_elements:
+        player_id = card_element.get('data-player-id')
+        name = _class_text(card_element, 'stats-card__player-name')
+        if not player_id or not name:
+            # Rendered client-side: the static page doesn't carry the fields we need
+            return None
+
+        cards.append({
+            'player_id': player_id,
+            'name': name,
+            'position': _class_text(card_element, 'stats-card__player-position'),
+            'nationality': _class_text(card_element, 'stats-card__player-country'),
+            'flag_image': _class_attr(card_element, 'stats-card__flag-icon', 'src'),
+            'image': _class_attr(card_element, 'statCardImg', 'src'),
+        })
+    return cards
+
+
+def _class_text(element, class_name):
+    found = element.find_class(class_name)
+    return ' '.join(found[0].text_content().split()) if found else ''
+
+
+def _class_attr(element, class_name, attribute):
+    found = element.find_class(class_name)
+    if not found:
+        return None
+    # Lazy-loaded images keep the real URL in data-src until a browser swaps it in; src is a placeholder
+    return found[0].get(f'data-{attribute}') or found[0].get(attribute)
+
+
+def browse(driver, url):
+    # Page loads share the host's rate limiter with the HTTP fetches; Selenium has no status code
+    throttle.call(url, lambda: driver.get(url), status=lambda response: 200)
+
+
+@instrumented('selenium')
+def scrape_squad_cards_selenium(club_id, club_name):
+    # Selenium is only imported by the processes that actually fall back to a browser
+    from .browser import EC, By, NoSuchElementException, WebDriverWait, lease_browser
+
+    # Read the squad cards while holding the browser, then hand it back before the stat scrapes
+    cards = []
+    with lease_browser() as driver:
+        browse(driver, squad_url(club_id, club_name))
         WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "stats-card")))
         player_elements = driver.find_elements(By.CLASS_NAME, "stats-card")
 
         for player_element in player_elements:
+            player_id = None
             try:
                 player_id = player_element.get_attribute("data-player-id")
 
-                # Check if the player already exists in the database and has stats
-                player = Player.objects.filter(player_id=player_id, team=team).first()
-                if player and player.stats:
-                    # If the player already has stats, return them directly from the database
-                    continue  # Skip scraping for this player if stats already exist
-
                 # Extract player data from the page
                 name_element = player_element.find_element(By.CLASS_NAME, "stats-card__player-name")
                 player_name = name_element.text
@@ -62,70 +159,59 @@ def scrape_club_squad(club_id, club_name):
                 flag_image_url = player_element.find_element(By.CLASS_NAME, "stats-card__flag-icon").get_attribute('src')
                 image_url = player_element.find_element(By.CLASS_NAME, "statCardImg").get_attribute('src')
 
-                # Save or update the player record in the database
-                player, _ = Player.objects.update_or_create(
-                    player_id=player_id,
-                    team=team,
-                    defaults={
-                        'name': player_name,
-                        'position': position,
-                        'nationality': nationality,
-                        'flag_image': flag_image_url,
-                        'image': image_url,
-                    }
-                )
-
-                # If scraping was done, also populate player stats if they don't exist
-                if not player.stats:
-                    stats = scrape_player_data(player_id, player_name)
-                    player.stats = stats
-                    player.save()
+                cards.append({
+                    'player_id': player_id,
+                    'name': player_name,
+                    'position': position,
+                    'nationality': nationality,
+                    'flag_image': flag_image_url,
+                    'image': image_url,
+                })
 
             except NoSuchElementException as e:
                 print(f"Error extracting data for player with ID: {player_id}. Error: {e}")
-    finally:
-        driver.quit()
 
-    # Return the updated list of players from the database
-    return list(Player.objects.filter(team=team).values())
+    return cards
 
 
 
 
 
 
-def scrape_player_list():
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
 
-    base_url = "https://www.premierleague.com/players"
-    driver.get(base_url)
+@instrumented('selenium')
+def scrape_player_list():
+    from .browser import EC, By, WebDriverWait, lease_browser
 
-    WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "player__name")))
+    base_url = site_url("/players")
 
     players = []
-    player_elements = driver.find_elements(By.CLASS_NAME, "player__name")
-
-    for player_element in player_elements:
-        href = player_element.get_attribute('href')
-        if href:
-            player_id = href.split('/')[4]
-            player_name = href.split('/')[5]
-            img_tag = player_element.find_element(By.TAG_NAME, 'img')
-            player_image_url = img_tag.get_attribute('src')
-
-            players.append({
-                'id': player_id,
-                'name': player_name,
-                'image': player_image_url
-            })
+    with lease_browser() as driver:
+        browse(driver, base_url)
+
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "player__name")))
+
+        player_elements = driver.find_elements(By.CLASS_NAME, "player__name")
+
+        for player_element in player_elements:
+            href = player_element.get_attribute('href')
+            if href:
+                player_id = href.split('/')[4]
+                player_name = href.split('/')[5]
+                img_tag = player_element.find_element(By.TAG_NAME, 'img')
+                player_image_url = img_tag.get_attribute('src')
+
+                players.append({
+                    'id': player_id,
+                    'name': player_name,
+                    'image': player_image_url
+                })
 
-    driver.quit()
     return players
 
 
 
+@instrumented('parse')
 def scrape_player_stats(soup):
     stats = {}
 
@@ -154,66 +240,329 @@ def scrape_player_stats(soup):
 
 
 
-def scrape_player_data(player_id, player_name):
-    try:
-        formatted_player_name = urllib.parse.quote(player_name.strip().replace('\n', '').replace(' ', '-').lower())
+def player_stats_url(player_id, player_name):
+    formatted_player_name = urllib.parse.quote(player_name.strip().replace('\n', '').replace(' ', '-').lower())
+    return site_url(f"/players/{player_id}/{formatted_player_name}/stats")
+
 
-        player_url = f"https://www.premierleague.com/players/{player_id}/{formatted_player_name}/stats"
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(player_url, headers=headers)
+@instrumented('fetch')
+def fetch_page(url):
+    try:
+        response = upstream.get(url)
 
         if response.status_code != 200:
-            print(f"Failed to retrieve page for {player_name}, status code: {response.status_code}")
+            print(f"Failed to retrieve {url}, status code: {response.status_code}")
             return None
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # Keep a copy so the page can be re-parsed later without fetching it again
+        save_snapshot(url, response.text)
+        return response.text
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        return None
+
+
+def fetch_player_page(player_id, player_name):
+    return fetch_page(player_stats_url(player_id, player_name))
 
-        # Get nationality and flag
-        nationality = soup.find('span', class_='player-overview__player-country').text.strip()
-        flag_image = soup.find('img', class_='player-overview__flag-icon').get('src')
 
-        # Locate the position inside the player overview section
-        position_section = soup.find('section', class_='player-overview__side-widget')
-        position_element = position_section.find('div', string="Position").find_next('div', class_='player-overview__info')
+@instrumented('parse')
+def parse_player_page(html, player_name, backend=None):
+    """Player details and stats from a stats page, using the SCRAPER_HTML_PARSER backend unless given."""
+    backend = backend or settings.SCRAPER_HTML_PARSER
+    try:
+        page = PLAYER_PAGE_PARSERS[backend](html)
 
-        if not position_element:
+        if not page['position']:
             print(f"Could not determine the position for player {player_name}.")
             return None
 
-        position = position_element.get_text(strip=True).lower()
-        print(f"Position for {player_name}: {position}")
-
-        # Scrape the player's stats (Unified function for all positions)
-        stats = scrape_player_stats(soup)
+        print(f"Position for {player_name}: {page['position']}")
 
         return {
             'name': player_name,
-            'position': position,
-            'nationality': nationality,
-            'flag_image': flag_image,
-            'stats': stats
+            'position': page['position'],
+            'nationality': page['nationality'],
+            'flag_image': page['flag_image'],
+            'stats': page['stats']
         }
     except Exception as e:
-        print(f"Error fetching player data for {player_name}: {e}")
+        print(f"Error parsing player data for {player_name}: {e}")
         return None
 
 
+def read_player_page_bs4(html):
+    from bs4 import BeautifulSoup
 
+    soup = BeautifulSoup(html, 'html.parser')
 
+    # Get nationality and flag
+    nationality = soup.find('span', class_='player-overview__player-country').text.strip()
+    flag_image = soup.find('img', class_='player-overview__flag-icon').get('src')
 
-def scrape_team_data():
-    cached_teams = cache.get('team_data')
-    if cached_teams:
-        return cached_teams
+    # Locate the position inside the player overview section
+    position_section = soup.find('section', class_='player-overview__side-widget')
+    position_element = position_section.find('div', string="Position").find_next('div', class_='player-overview__info')
 
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    return {
+        'position': position_element.get_text(strip=True).lower() if position_element else None,
+        'nationality': nationality,
+        'flag_image': flag_image,
+        # Scrape the player's stats (Unified function for all positions)
+        'stats': scrape_player_stats(soup),
+    }
 
-    base_url = "https://www.premierleague.com/clubs"
-    driver.get(base_url)
 
-    try:
+def _has_class(class_name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+# Compiled once per process; each mirrors one find()/find_all() of the BeautifulSoup parser
+_PLAYER_COUNTRY = etree.XPath(f"(//span[{_has_class('player-overview__player-country')}])[1]")
+_FLAG_ICON = etree.XPath(f"(//img[{_has_class('player-overview__flag-icon')}])[1]")
+_SIDE_WIDGET = etree.XPath(f"(//section[{_has_class('player-overview__side-widget')}])[1]")
+# The label div holds nothing but the text "Position"; the value is the next info div in the document
+_POSITION_INFO = etree.XPath(
+    f"(.//div[not(*) and text()='Position'])[1]/following::div[{_has_class('player-overview__info')}][1]"
+)
+_TOP_STATS = etree.XPath(f"(//div[{_has_class('player-stats__top-stats')}])[1]")
+_TOP_STAT = etree.XPath(f".//div[{_has_class('player-stats__top-stat')}]")
+_TOP_STAT_LABEL = etree.XPath(f"(.//span[{_has_class('player-stats__top-stat-value')}])[1]")
+_STAT_CONTAINER = etree.XPath(f"(.//span[{_has_class('allStatContainer')}])[1]")
+_STATS_WRAPPER = etree.XPath(f"(//ul[{_has_class('player-stats__stats-wrapper')}])[1]")
+_STAT_ITEM = etree.XPath(f".//li[{_has_class('player-stats__stat')}]")
+_STAT_TITLE = etree.XPath(f"(.//div[{_has_class('player-stats__stat-title')}])[1]")
+_STAT_VALUE = etree.XPath(f".//div[{_has_class('player-stats__stat-value')}]")
+
+
+def _first(xpath, element):
+    found = xpath(element)
+    return found[0] if found else None
+
+
+def read_player_page_lxml(html):
+    doc = lxml.html.fromstring(html)
+
+    nationality = _first(_PLAYER_COUNTRY, doc).text_content().strip()
+    flag_image = _first(_FLAG_ICON, doc).get('src')
+    position_element = _first(_POSITION_INFO, _first(_SIDE_WIDGET, doc))
+
+    return {
+        'position': ''.join(text.strip() for text in position_element.itertext()).lower() if position_element is not None else None,
+        'nationality': nationality,
+        'flag_image': flag_image,
+        'stats': scrape_player_stats_lxml(doc),
+    }
+
+
+@instrumented('parse')
+def scrape_player_stats_lxml(doc):
+    """Same output as scrape_player_stats, read from an lxml tree."""
+    stats = {}
+
+    top_stats_section = _first(_TOP_STATS, doc)
+    if top_stats_section is not None:
+        for top_stat in _TOP_STAT(top_stats_section):
+            stat_label = (_first(_TOP_STAT_LABEL, top_stat).text or '').strip()
+            stats[stat_label] = _first(_STAT_CONTAINER, top_stat).text_content().strip()
+
+    stats_section = _first(_STATS_WRAPPER, doc)
+    if stats_section is not None:
+        for stat_item in _STAT_ITEM(stats_section):
+            category_title = _first(_STAT_TITLE, stat_item).text_content().strip()
+            for stat_value in _STAT_VALUE(stat_item):
+                stat_name = (stat_value.text or '').strip()
+                stats[f"{category_title} - {stat_name}"] = _first(_STAT_CONTAINER, stat_value).text_content().strip()
+
+    return stats
+
+
+PLAYER_PAGE_PARSERS = {
+    'bs4': read_player_page_bs4,
+    'lxml': read_player_page_lxml,
+}
+
+
+@instrumented('scrape')
+def scrape_player_data(player_id, player_name):
+    html = fetch_player_page(player_id, player_name)
+    if html is None:
+        return None
+    return parse_player_page(html, player_name)
+
+
+@instrumented('scrape')
+def refresh_player(player_id, player_name):
+    """Scrape a player's details page and store it on the player row, if there is one."""
+    # A concurrent scrape of the same player hands its result over instead of fetching again
+    return single_flight(f"player:{player_id}", update_player, player_id, player_name)
+
+
+@instrumented('scrape')
+def update_player(player_id, player_name):
+    player_data = scrape_player_data(player_id, player_name)
+    if player_data:
+        player = Player.objects.filter(player_id=player_id).first()
+        if player:
+            save_player_details(player, player_data)
+    return player_data
+
+
+@instrumented('scrape')
+def scrape_players_data(players, parse_workers=None):
+    """
+    Fetch and parse the stats pages of many players at once.
+
+    `players` is an iterable of (player_id, player_name) pairs. Pages are downloaded
+    concurrently over the shared keep-alive session and handed to a parser pool as
+    they arrive (`parse_workers` overrides SCRAPER_PARSE_WORKERS). Returns a dict of
+    player_id -> scrape_player_data() result (None on failure).
+    """
+    players = list(players)
+    results = {player_id: None for player_id, _ in players}
+    if not players:
+        return results
+
+    if parse_workers is None:
+        parse_workers = settings.SCRAPER_PARSE_WORKERS
+    parser_pool = get_parser_pool(parse_workers) if parse_workers > 1 else None
+
+    with ThreadPoolExecutor(max_workers=settings.SCRAPER_HTTP_CONCURRENCY) as fetchers:
+        pages = {
+            fetchers.submit(fetch_player_page, player_id, player_name): (player_id, player_name)
+            for player_id, player_name in players
+        }
+
+        parsing = {}
+        for page in as_completed(pages):
+            player_id, player_name = pages[page]
+            html = page.result()
+            if html is None:
+                continue
+            if parser_pool:
+                try:
+                    parsing[parser_pool.submit(parse_player_page, html, player_name)] = (player_id, player_name, html)
+                    continue
+                except BrokenProcessPool:
+                    # A parser process died: the rest of the batch is parsed here, the next batch gets a new pool
+                    discard_parser_pool(parser_pool)
+                    parser_pool = None
+            results[player_id] = parse_player_page(html, player_name)
+
+    for parsed in as_completed(parsing):
+        player_id, player_name, html = parsing[parsed]
+        try:
+            results[player_id] = parsed.result()
+        except BrokenProcessPool:
+            # Pages queued on a pool whose process died are parsed here instead
+            if parser_pool:
+                discard_parser_pool(parser_pool)
+                parser_pool = None
+            results[player_id] = parse_player_page(html, player_name)
+        except Exception as e:
+            print(f"Error parsing player data for {player_id}: {e}")
+
+    return results
+
+
+_parser_pools = {}
+_parser_pools_lock = threading.Lock()
+
+
+def process_context():
+    """
+    The multiprocessing context for worker processes: a forkserver (spawn where there is none),
+    never a fork of this process. A fork would copy locks held by the fetcher and worker threads
+    in their locked state, and share the keep-alive sockets of the HTTP session with the parent.
+    Processes started from it have to set Django up themselves (initializer=django.setup).
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def get_parser_pool(workers):
+    """
+    This process's pool of `workers` parser processes, started on first use (see
+    process_context) and kept for the next batches.
+    """
+    with _parser_pools_lock:
+        pool = _parser_pools.get(workers)
+        if pool is None:
+            # The parser imports the models, so each process sets Django up before its first page
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=process_context(), initializer=django.setup)
+            _parser_pools[workers] = pool
+        return pool
+
+
+def discard_parser_pool(pool):
+    with _parser_pools_lock:
+        for workers, existing in list(_parser_pools.items()):
+            if existing is pool:
+                del _parser_pools[workers]
+    pool.shutdown(wait=False)
+
+
+
+
+
+@instrumented('scrape')
+def scrape_team_data(refresh=False):
+    if not refresh:
+        cached_teams = cache.get(cache_key(TEAMS, 'scraped'))
+        cache_lookup(TEAMS, bool(cached_teams))
+        if cached_teams:
+            return cached_teams
+
+    html = fetch_page(site_url("/clubs"))
+    teams = parse_club_index(html) if html else None
+    if teams is None:
+        if not settings.SCRAPER_SELENIUM_FALLBACK:
+            print("No clubs in the static club index page")
+            return []
+        print("Falling back to Selenium for the club index page")
+        teams = scrape_team_list_selenium()
+
+    # Save the teams in the database
+    save_teams(teams)
+
+    cache.set(cache_key(TEAMS, 'scraped'), teams, 60 * 60 * 24)
+    # The club list is fresh until this expires (see views.teams_validators)
+    cache.set(cache_key(TEAMS, 'fresh'), True, ttl('teams').total_seconds())
+    return teams
+
+
+@instrumented('parse')
+def parse_club_index(html):
+    """Extract the clubs from the club index HTML; None if the markup lacks them."""
+    doc = lxml.html.fromstring(html)
+    containers = doc.xpath('//div[contains(concat(" ", normalize-space(@class), " "), " clubIndex ")]')
+    if not containers:
+        return None
+
+    teams = []
+    for team_element in containers[0].find_class('club-card-wrapper')[:20]:
+        links = team_element.xpath('.//a[@href]')
+        if not links:
+            return None
+        href = urllib.parse.urljoin(site_url("/clubs"), links[0].get('href'))
+        img_tags = team_element.xpath('.//img')
+        srcset = img_tags[0].get('srcset') if img_tags else None
+
+        teams.append({
+            'id': href.split('/')[4],
+            'name': href.split('/')[5].replace('-', ' '),
+            'logo': srcset.split(",")[-1].split()[0] if srcset else "",
+        })
+    return teams or None
+
+
+@instrumented('selenium')
+def scrape_team_list_selenium():
+    from .browser import EC, By, WebDriverWait, lease_browser
+
+    with lease_browser() as driver:
+        browse(driver, site_url("/clubs"))
+
         WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.clubIndex.col-12")))
         team_container = driver.find_element(By.CSS_SELECTOR, "div.clubIndex.col-12")
         team_elements = team_container.find_elements(By.CLASS_NAME, "club-card-wrapper")
@@ -233,10 +582,4 @@ def scrape_team_data():
                 'logo': team_logo_url
             })
 
-            # Save team in the database
-            Team.objects.update_or_create(id=team_id, defaults={'name': team_name.replace('-', ' '), 'crest': team_logo_url})
-
-        cache.set('team_data', teams, 60 * 60 * 24)
-        return teams
-    finally:
-        driver.quit()
+    return teams
@@ -0,0 +1,190 @@
+import unicodedata
+
+from django.db import connection
+
+from .models import Player, Team
+
+
+# Letters that don't decompose into a base letter + accent under NFKD
+SPECIAL_LETTERS = str.maketrans({
+    'ø': 'o', 'Ø': 'o',
+    'æ': 'ae', 'Æ': 'ae',
+    'œ': 'oe', 'Œ': 'oe',
+    'ß': 'ss',
+    'đ': 'd', 'Đ': 'd',
+    'ð': 'd', 'Ð': 'd',
+    'ł': 'l', 'Ł': 'l',
+    'ı': 'i',
+    'þ': 'th', 'Þ': 'th',
+})
+
+# Minimum trigram similarity for a fuzzy (typo-tolerant) match
+MIN_SIMILARITY = 0.3
+# How many of the rows sharing the most trigrams with a query are scored for a fuzzy match
+FUZZY_CANDIDATES = 200
+
+# FTS5 tables (migration 0011) keyed by rowid = player_id, holding normalize()d text.
+# SEARCH_TABLE has a column per field, searched by word prefixes and ranked with bm25;
+# FUZZY_TABLE has all of it in one trigram-tokenized column, for matching through typos.
+SEARCH_TABLE = 'stats_player_search'
+FUZZY_TABLE = 'stats_player_trigrams'
+# bm25 weights of name, team, position and nationality
+COLUMN_WEIGHTS = '10.0, 4.0, 2.0, 2.0'
+
+# Player fields the tables index or the results show; saving only other fields leaves search alone
+SEARCH_FIELDS = {'name', 'team', 'position', 'nationality', 'image'}
+
+ENTRY_COLUMNS = "p.player_id, p.name, COALESCE(t.name, ''), p.team_id, p.position, p.nationality, p.image"
+
+
+def normalize(text):
+    """Lowercase, accent-fold and strip punctuation: 'Martin Ødegaard' -> 'martin odegaard'."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text.translate(SPECIAL_LETTERS))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = ''.join(char if char.isalnum() else ' ' for char in text.lower())
+    return ' '.join(text.split())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def index_players(players):
+    """Add or replace the search rows of `players`."""
+    players = list(players)
+    if not players:
+        return
+
+    # One query for the teams that aren't already loaded on the players
+    missing = {player.team_id for player in players if player.team_id and not Player.team.is_cached(player)}
+    team_names = dict(Team.objects.filter(pk__in=missing).values_list('id', 'name')) if missing else {}
+
+    rows = []
+    for player in players:
+        team_name = team_names[player.team_id] if player.team_id in team_names else player.team.name
+        rows.append((
+            player.pk, normalize(player.name), normalize(team_name),
+            normalize(player.position), normalize(player.nationality),
+        ))
+
+    with connection.cursor() as cursor:
+        _delete_rows(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, name, team, position, nationality) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+        cursor.executemany(
+            f"INSERT INTO {FUZZY_TABLE} (rowid, text) VALUES (%s, %s)",
+            [(row[0], ' '.join(part for part in row[1:] if part)) for row in rows],
+        )
+
+
+def remove_player(player_id):
+    with connection.cursor() as cursor:
+        _delete_rows(cursor, [player_id])
+
+
+def rename_team(team):
+    index_players(team.players.select_related('team'))
+
+
+def _delete_rows(cursor, player_ids):
+    # Stay under SQLite's limit on query parameters
+    for start in range(0, len(player_ids), 500):
+        chunk = player_ids[start:start + 500]
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", chunk)
+        cursor.execute(f"DELETE FROM {FUZZY_TABLE} WHERE rowid IN ({placeholders})", chunk)
+
+
+def search_players(query, limit=None):
+    """
+    Players ranked by how well they match `query`, as dicts for the search page.
+
+    Every query term has to be a word prefix in the name, team, position or nationality
+    ("arsenal midf norway"); when nothing matches, names within typo distance are tried.
+    """
+    query = normalize(query)
+    if not query:
+        players = Player.objects.select_related('team').order_by('name')
+        return [_entry_from_player(player) for player in (players[:limit] if limit else players)]
+
+    return _prefix_matches(query, limit) or _fuzzy_matches(query, limit)
+
+
+def _prefix_matches(query, limit):
+    match = ' '.join(f'"{token}"*' for token in query.split())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {ENTRY_COLUMNS} FROM {SEARCH_TABLE} s
+            JOIN stats_player p ON p.player_id = s.rowid
+            LEFT JOIN stats_team t ON t.id = p.team_id
+            WHERE {SEARCH_TABLE} MATCH %s
+            ORDER BY bm25({SEARCH_TABLE}, {COLUMN_WEIGHTS}), p.name
+            LIMIT %s
+            """,
+            [match, limit or -1],
+        )
+        return [_entry(row) for row in cursor.fetchall()]
+
+
+def _fuzzy_matches(query, limit):
+    tokens = query.split()
+    grams = {token[i:i + 3] for token in tokens for i in range(len(token) - 2)}
+    if not grams:
+        return []
+
+    # Rows sharing the most trigrams with the query come first; only those are scored
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {ENTRY_COLUMNS}, f.text FROM {FUZZY_TABLE} f
+            JOIN stats_player p ON p.player_id = f.rowid
+            LEFT JOIN stats_team t ON t.id = p.team_id
+            WHERE {FUZZY_TABLE} MATCH %s
+            ORDER BY bm25({FUZZY_TABLE})
+            LIMIT %s
+            """,
+            [' OR '.join(f'"{gram}"' for gram in sorted(grams)), FUZZY_CANDIDATES],
+        )
+        rows = cursor.fetchall()
+
+    query_grams = [trigrams(token) for token in tokens]
+    scored = []
+    for row in rows:
+        text_grams = [trigrams(token) for token in row[-1].split()]
+        # Average over query tokens of the best-matching token of the row (Jaccard similarity)
+        similarity = sum(
+            max(len(grams & other) / len(grams | other) for other in text_grams)
+            for grams in query_grams
+        ) / len(query_grams)
+        if similarity >= MIN_SIMILARITY:
+            scored.append((similarity, _entry(row[:-1])))
+
+    scored.sort(key=lambda item: (-item[0], normalize(item[1]['name'])))
+    results = [entry for _, entry in scored]
+    return results[:limit] if limit else results
+
+
+def _entry(row):
+    player_id, name, team, team_id, position, nationality, image = row
+    return {
+        'player_id': player_id,
+        'name': name,
+        'team': team,
+        'team_id': team_id,
+        'position': position,
+        'nationality': nationality,
+        'image': image,
+    }
+
+
+def _entry_from_player(player):
+    return _entry((
+        player.pk, player.name, player.team.name if player.team_id else '',
+        player.team_id, player.position, player.nationality, player.image,
+    ))
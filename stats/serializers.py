@@ -0,0 +1,80 @@
+from rest_framework import serializers
+
+from .models import Change, Team, Player, PlayerStat
+
+
+class SparseFieldsSerializer(serializers.ModelSerializer):
+    """
+    A serializer whose output is limited to the `?fields=a,b` of the request, or to
+    Meta.default_fields without it. Meta.field_columns maps fields to the model columns
+    they read (a field reads its own column otherwise), so views can only() the rest.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = self.requested_fields(self.context.get('request'))
+        for name in list(self.fields):
+            if name not in wanted:
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        param = request.query_params.get('fields') if request is not None else None
+        if not param:
+            return list(getattr(cls.Meta, 'default_fields', cls.Meta.fields))
+
+        wanted = [name.strip() for name in param.split(',') if name.strip()]
+        unknown = [name for name in wanted if name not in cls.Meta.fields]
+        if unknown:
+            raise serializers.ValidationError({
+                'fields': f"Unknown fields {', '.join(unknown)}; choose from {', '.join(cls.Meta.fields)}"
+            })
+        return wanted
+
+    @classmethod
+    def columns(cls, request):
+        """The model columns the requested fields read, for QuerySet.only()."""
+        field_columns = getattr(cls.Meta, 'field_columns', {})
+        columns = [cls.Meta.model._meta.pk.name]
+        for name in cls.requested_fields(request):
+            columns.extend(field_columns.get(name, [name]))
+        return list(dict.fromkeys(columns))
+
+
+class TeamSerializer(SparseFieldsSerializer):
+    class Meta:
+        model = Team
+        fields = ['id', 'name', 'crest', 'updated_at']
+
+
+class PlayerSerializer(SparseFieldsSerializer):
+    team = serializers.IntegerField(source='team_id', read_only=True)
+    team_name = serializers.CharField(source='team.name', read_only=True)
+
+    class Meta:
+        model = Player
+        fields = [
+            'player_id', 'name', 'team', 'team_name', 'position', 'nationality',
+            'flag_image', 'image', 'updated_at', 'stats',
+        ]
+        # The stats blob is the bulk of a player row; it is only read when asked for
+        default_fields = [name for name in fields if name != 'stats']
+        field_columns = {
+            'team': ['team_id'],
+            'team_name': ['team_id', 'team__name'],
+        }
+
+
+class PlayerStatSerializer(SparseFieldsSerializer):
+    player = serializers.IntegerField(source='player_id', read_only=True)
+
+    class Meta:
+        model = PlayerStat
+        fields = ['player', 'category', 'name', 'value', 'season']
+        field_columns = {'player': ['player_id']}
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Change
+        fields = ['id', 'kind', 'object_id', 'action', 'version', 'data', 'changed_at']
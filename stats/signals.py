@@ -0,0 +1,71 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, search
+from .models import Change, Player, Team
+from .leaderboards import leaderboards
+from .persistence import forget_validators, player_stats_saved, players_saved, teams_saved
+
+
+@receiver(post_save, sender=Player)
+def index_player(sender, instance, update_fields=None, **kwargs):
+    # Freshness-only saves (last_scraped_at, expires_at) change nothing search shows
+    if update_fields is not None and not search.SEARCH_FIELDS & set(update_fields):
+        return
+    search.index_players([instance])
+    caching.invalidate(caching.SEARCH)
+
+
+@receiver(players_saved, sender=Player)
+def index_players(sender, players, **kwargs):
+    search.index_players(players)
+    leaderboards.move_players(players)
+    caching.invalidate(caching.SEARCH)
+
+
+@receiver(player_stats_saved, sender=Player)
+def rank_players(sender, players, **kwargs):
+    leaderboards.update_players(players)
+
+
+@receiver(post_delete, sender=Player)
+def unindex_player(sender, instance, **kwargs):
+    search.remove_player(instance.pk)
+    leaderboards.remove_players([instance.pk])
+    caching.invalidate(caching.SEARCH)
+
+
+@receiver(post_save, sender=Team)
+def reindex_team(sender, instance, update_fields=None, **kwargs):
+    # save_squad only saves the team's freshness and version, which search doesn't show
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    search.rename_team(instance)
+    caching.invalidate(caching.SEARCH)
+
+
+@receiver(teams_saved, sender=Team)
+def reindex_teams(sender, teams, **kwargs):
+    for team in teams:
+        search.rename_team(team)
+    caching.invalidate(caching.SEARCH)
+
+
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Player)
+def log_deletion(sender, instance, **kwargs):
+    # Runs inside the delete's transaction, cascaded player deletes included
+    Change.of(instance, Change.DELETED, timezone.now()).save()
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Player)
+def forget_page_validators(sender, instance, **kwargs):
+    # Saves outside the persistence functions (the admin, the shell) must not leave cached ETags behind
+    if sender is Team:
+        forget_validators(teams=[instance])
+    else:
+        forget_validators(players=[instance])
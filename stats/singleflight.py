@@ -0,0 +1,84 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ScrapeLock
+
+
+class SingleFlightTimeout(Exception):
+    pass
+
+
+def owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def acquire(key, owner):
+    """Take the lock for `key` if nobody holds it (or the holder's lease ran out)."""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+    try:
+        with transaction.atomic():
+            ScrapeLock.objects.create(key=key, owner=owner, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        taken = ScrapeLock.objects.filter(
+            Q(owner='') | Q(expires_at__lt=now), key=key
+        ).update(owner=owner, expires_at=expires_at)
+        return taken == 1
+
+
+def release(key, owner, result=None):
+    ScrapeLock.objects.filter(key=key, owner=owner).update(
+        owner='', expires_at=None, result=result, finished_at=timezone.now()
+    )
+
+
+def wait(key, since, timeout):
+    """Wait for the current holder of `key` to finish; its lock row, or None if it took too long."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        lock = ScrapeLock.objects.filter(key=key).first()
+        if lock is None or (not lock.owner and lock.finished_at and lock.finished_at >= since):
+            return lock
+        if lock.owner and lock.expires_at < timezone.now():
+            # The holder died; let the caller take over
+            return None
+        time.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+    return None
+
+
+def single_flight(key, func, *args, reuse=None, timeout=None):
+    """
+    Run func(*args) at most once at a time per `key`, across threads and processes.
+
+    Callers arriving while another one runs it wait (up to `timeout` seconds, default
+    SINGLE_FLIGHT_WAIT) instead of scraping again, then get reuse() if given, which
+    should re-read what the holder stored, or else the holder's JSON-serializable result.
+    """
+    timeout = settings.SINGLE_FLIGHT_WAIT if timeout is None else timeout
+    owner = owner_id()
+    deadline = time.monotonic() + timeout
+
+    while True:
+        since = timezone.now()
+        if acquire(key, owner):
+            result = None
+            try:
+                result = func(*args)
+                return result
+            finally:
+                release(key, owner, None if reuse else result)
+
+        lock = wait(key, since, max(0, deadline - time.monotonic()))
+        if lock is not None:
+            return reuse() if reuse else lock.result
+        if time.monotonic() >= deadline:
+            raise SingleFlightTimeout(f"Gave up waiting for the running scrape of {key}")
@@ -0,0 +1,61 @@
+import gzip
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PageSnapshot
+
+
+def blob_path(digest):
+    return Path(settings.SNAPSHOT_DIR) / digest[:2] / f"{digest}.html.gz"
+
+
+def write_blob(html):
+    """Store compressed HTML under its sha256; identical pages share one file. Returns the digest."""
+    data = html.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file and rename, so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(data))
+        os.replace(tmp, path)
+    return digest, len(data)
+
+
+def read_blob(digest):
+    with gzip.open(blob_path(digest), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def save_snapshot(url, html):
+    """Record a fetched page. An unchanged page only moves the last_seen_at of its snapshot."""
+    if not settings.SNAPSHOTS_ENABLED:
+        return None
+
+    try:
+        digest, size = write_blob(html)
+        now = timezone.now()
+        latest = PageSnapshot.objects.filter(url=url).order_by('-fetched_at').first()
+        if latest and latest.digest == digest:
+            PageSnapshot.objects.filter(pk=latest.pk).update(last_seen_at=now)
+            return latest
+        return PageSnapshot.objects.create(url=url, digest=digest, size=size, fetched_at=now, last_seen_at=now)
+    except Exception as e:
+        # Keeping a copy must never break the scrape itself
+        print(f"Error saving snapshot of {url}: {e}")
+        return None
+
+
+def latest_snapshots(url_pattern):
+    """The newest snapshot of every URL matching the regex `url_pattern`, keyed by URL."""
+    latest = {}
+    for snapshot in PageSnapshot.objects.filter(url__regex=url_pattern).order_by('url', '-fetched_at'):
+        latest.setdefault(snapshot.url, snapshot)
+    return latest
@@ -0,0 +1,16 @@
+from django import template
+
+from stats import images
+
+register = template.Library()
+
+
+@register.filter
+def media(url, size=images.ORIGINAL):
+    """{{ player.image|media:'thumb' }}: the image proxy's URL for an upstream image."""
+    return images.media_url(url, size)
+
+
+@register.simple_tag
+def missing_photo(size=images.ORIGINAL):
+    return images.media_url(images.MISSING_PHOTO, size)
@@ -1,3 +1,1327 @@
-from django.test import TestCase
+import json
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import redirect_stdout
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import django
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import Change, HostThrottle, PageSnapshot, Player, PlayerStat, ScrapeJob, ScrapeLock, Team, UpdateRun
+from .leaderboards import LeaderboardStore
+from .persistence import save_player_details, save_player_stats, save_players_details, save_squad, save_teams
+from .scrape import (
+    PLAYER_PAGE_PARSERS, get_parser_pool, parse_club_index, parse_player_page, parse_squad_page,
+    scrape_players_data, scrape_squad_cards, scrape_team_data,
+)
+from .search import search_players
+from .singleflight import single_flight
+from .snapshots import read_blob, save_snapshot
+from . import caching, images, jobs, metrics, singleflight, throttle
+
+
+# Tests never touch the file cache under BASE_DIR: the same two tiers as production, in memory
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'stats.cache_backends.TieredCache',
+        'LOCATION': 'tests',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_MAX_ENTRIES': 3, 'LOCAL_TIMEOUT': 30},
+    },
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-shared'},
+}
+
+
+OVERVIEW = """
+<section class="player-overview__side-widget">
+  <div class="player-overview__col">
+    <div class="player-overview__label">Club</div>
+    <div class="player-overview__info"><a href="/clubs/1/Arsenal/overview">Arsenal</a></div>
+  </div>
+  <div class="player-overview__col">
+    <div class="player-overview__label">Position</div>
+    <div class="player-overview__info">
+      {position}
+    </div>
+  </div>
+</section>
+<div class="player-info__details-list">
+  <img class="img player-overview__flag-icon" src="https://resources.premierleague.com/flags/{flag}.png" alt="">
+  <span class="player-overview__player-country">{country}</span>
+</div>
+"""
+
+TOP_STATS = """
+<div class="player-stats__top-stats">
+  <div class="player-stats__top-stat">
+    <span class="player-stats__top-stat-value">Appearances <span class="allStatContainer" data-stat="appearances">{appearances}</span></span>
+  </div>
+  <div class="player-stats__top-stat">
+    <span class="player-stats__top-stat-value">
+      Wins
+      <span class="allStatContainer" data-stat="wins"> {wins} </span>
+    </span>
+  </div>
+</div>
+"""
+
+ATTACK = """
+<li class="player-stats__stat">
+  <div class="player-stats__stat-title">Attack</div>
+  <div class="player-stats__stat-value">Goals<span class="allStatContainer statgoals">{goals}</span></div>
+  <div class="player-stats__stat-value">Shooting accuracy %
+    <span class="allStatContainer">{accuracy}</span>
+  </div>
+</li>
+"""
+
+GOALKEEPING = """
+<li class="player-stats__stat">
+  <div class="player-stats__stat-title"> Goalkeeping </div>
+  <div class="player-stats__stat-value">Saves<span class="allStatContainer">1,204</span></div>
+  <div class="player-stats__stat-value">Penalties Saved<span class="allStatContainer">7</span></div>
+  <div class="player-stats__stat-value">Punches&nbsp;<span class="allStatContainer">&nbsp;98</span></div>
+</li>
+<li class="player-stats__stat player-stats__stat--discipline">
+  <div class="player-stats__stat-title">Discipline</div>
+  <div class="player-stats__stat-value">Yellow cards<span class="allStatContainer"><!-- updated -->12</span></div>
+</li>
+"""
+
+
+def page(overview='', top_stats='', stat_items=''):
+    stats = f'<ul class="player-stats__stats-wrapper">{stat_items}</ul>' if stat_items else ''
+    return f"<html><head><title>Player Stats</title></head><body>{overview}{top_stats}{stats}</body></html>"
+
+
+# Player stats pages the parser backends must agree on, with the result they should give
+PLAYER_PAGES = {
+    'forward': (
+        page(
+            OVERVIEW.format(position='Forward', flag='GB-ENG', country='England'),
+            TOP_STATS.format(appearances='178', wins='104'),
+            ATTACK.format(goals='49', accuracy='45%'),
+        ),
+        {
+            'name': 'Bukayo Saka',
+            'position': 'forward',
+            'nationality': 'England',
+            'flag_image': 'https://resources.premierleague.com/flags/GB-ENG.png',
+            'stats': {
+                'Appearances': '178',
+                'Wins': '104',
+                'Attack - Goals': '49',
+                'Attack - Shooting accuracy %': '45%',
+            },
+        },
+    ),
+    'goalkeeper': (
+        page(
+            OVERVIEW.format(position='<strong>Goal</strong>keeper', flag='BR', country=' Brazil '),
+            TOP_STATS.format(appearances='210', wins='131'),
+            GOALKEEPING,
+        ),
+        {
+            'name': 'Bukayo Saka',
+            'position': 'goalkeeper',
+            'nationality': 'Brazil',
+            'flag_image': 'https://resources.premierleague.com/flags/BR.png',
+            'stats': {
+                'Appearances': '210',
+                'Wins': '131',
+                'Goalkeeping - Saves': '1,204',
+                'Goalkeeping - Penalties Saved': '7',
+                'Goalkeeping - Punches': '98',
+                'Discipline - Yellow cards': '12',
+            },
+        },
+    ),
+    'no stats': (
+        page(OVERVIEW.format(position='Defender', flag='FR', country="Côte d'Ivoire")),
+        {
+            'name': 'Bukayo Saka',
+            'position': 'defender',
+            'nationality': "Côte d'Ivoire",
+            'flag_image': 'https://resources.premierleague.com/flags/FR.png',
+            'stats': {},
+        },
+    ),
+    'no position': (
+        page(
+            OVERVIEW.format(position='', flag='ES', country='Spain'),
+            TOP_STATS.format(appearances='3', wins='1'),
+        ),
+        None,
+    ),
+    'no overview': (page(top_stats=TOP_STATS.format(appearances='3', wins='1')), None),
+    'not a player page': ('<html><body><p>Page not found</p></body></html>', None),
+}
+
+
+class PlayerPageParserTests(SimpleTestCase):
+    def test_backends_match_expected_results(self):
+        for backend in PLAYER_PAGE_PARSERS:
+            for label, (html, expected) in PLAYER_PAGES.items():
+                with self.subTest(backend=backend, page=label):
+                    self.assertEqual(parse_player_page(html, 'Bukayo Saka', backend=backend), expected)
+
+    def test_backends_agree(self):
+        for label, (html, _) in PLAYER_PAGES.items():
+            with self.subTest(page=label):
+                results = {backend: parse_player_page(html, 'Bukayo Saka', backend=backend) for backend in PLAYER_PAGE_PARSERS}
+                self.assertEqual(results['lxml'], results['bs4'])
+
+    def test_default_backend_from_settings(self):
+        html, expected = PLAYER_PAGES['forward']
+        for backend in PLAYER_PAGE_PARSERS:
+            with self.subTest(backend=backend), self.settings(SCRAPER_HTML_PARSER=backend):
+                self.assertEqual(parse_player_page(html, 'Bukayo Saka'), expected)
+
+
+class ParserPoolTests(SimpleTestCase):
+    def test_batches_share_one_pool(self):
+        pages = {1: PLAYER_PAGES['forward'][0], 2: PLAYER_PAGES['goalkeeper'][0], 3: None}
+        with mock.patch('stats.scrape.fetch_player_page', side_effect=lambda player_id, name: pages[player_id]):
+            first = scrape_players_data([(1, 'Bukayo Saka'), (2, 'Bukayo Saka')], parse_workers=2)
+            pool = get_parser_pool(2)
+            second = scrape_players_data([(2, 'Bukayo Saka'), (3, 'Bukayo Saka')], parse_workers=2)
+
+        self.assertEqual(first, {1: PLAYER_PAGES['forward'][1], 2: PLAYER_PAGES['goalkeeper'][1]})
+        self.assertEqual(second, {2: PLAYER_PAGES['goalkeeper'][1], 3: None})
+        self.assertIs(get_parser_pool(2), pool)
+        self.assertNotEqual(pool._mp_context.get_start_method(), 'fork')
+
+    @override_settings(SCRAPER_HTTP_CONCURRENCY=1)
+    def test_dead_parser_process(self):
+        pool = get_parser_pool(2)
+        submitted = pool._queue_count
+
+        def wait_for(condition):
+            deadline = time.monotonic() + 10
+            while not condition():
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+
+        def fetch_player_page(player_id, name):
+            if player_id == 2:
+                # The first page went to the pool: kill its processes before the second is submitted
+                wait_for(lambda: pool._queue_count > submitted and pool._processes)
+                for process in list(pool._processes.values()):
+                    process.kill()
+                wait_for(lambda: pool._broken)
+            return PLAYER_PAGES['forward' if player_id == 1 else 'goalkeeper'][0]
+
+        with mock.patch('stats.scrape.fetch_player_page', side_effect=fetch_player_page):
+            results = scrape_players_data([(1, 'Bukayo Saka'), (2, 'Bukayo Saka')], parse_workers=2)
+            # The dead pool was dropped, and the next batch gets a working one
+            self.assertIsNot(get_parser_pool(2), pool)
+            again = scrape_players_data([(1, 'Bukayo Saka')], parse_workers=2)
+
+        self.assertEqual(results, {1: PLAYER_PAGES['forward'][1], 2: PLAYER_PAGES['goalkeeper'][1]})
+        self.assertEqual(again, {1: PLAYER_PAGES['forward'][1]})
+
+
+SQUAD_PAGE = """
+<html><body><ul class="squadListContainer">
+  <li><div class="stats-card" data-player-id="{first_id}">
+    <img class="statCardImg" data-src="https://resources.premierleague.com/photos/p223340.png" src="/placeholder.png">
+    <div class="stats-card__player-name">
+      Bukayo
+      <span>Saka</span>
+    </div>
+    <div class="stats-card__player-position">Forward</div>
+    <img class="stats-card__flag-icon" src="https://resources.premierleague.com/flags/GB-ENG.png">
+    <span class="stats-card__player-country"> England </span>
+  </div></li>
+  <li><div class="stats-card" data-player-id="8">
+    <div class="stats-card__player-name">Declan Rice</div>
+    <div class="stats-card__player-position">Midfielder</div>
+  </div></li>
+</ul></body></html>
+"""
+
+CLUB_INDEX = """
+<html><body><div class="clubIndex col-12"><ul>
+  <li class="club-card-wrapper"><a href="/clubs/1/Arsenal/overview">
+    <img srcset="https://resources.premierleague.com/badges/25/t3.png 1x, https://resources.premierleague.com/badges/50/t3@x2.png 2x">
+  </a></li>
+  <li class="club-card-wrapper"><a href="https://www.premierleague.com/clubs/11/Manchester-City/overview">Man City</a></li>
+  {more}
+</ul></div></body></html>
+"""
+
+
+class SquadPageParserTests(SimpleTestCase):
+    def test_cards(self):
+        self.assertEqual(parse_squad_page(SQUAD_PAGE.format(first_id=2)), [
+            {
+                'player_id': '2',
+                'name': 'Bukayo Saka',
+                'position': 'Forward',
+                'nationality': 'England',
+                'flag_image': 'https://resources.premierleague.com/flags/GB-ENG.png',
+                # Lazy-loaded: the real photo is in data-src
+                'image': 'https://resources.premierleague.com/photos/p223340.png',
+            },
+            {
+                'player_id': '8', 'name': 'Declan Rice', 'position': 'Midfielder',
+                'nationality': '', 'flag_image': None, 'image': None,
+            },
+        ])
+
+    def test_pages_without_cards(self):
+        # No cards at all, or cards rendered client-side without their player ids
+        self.assertIsNone(parse_squad_page('<html><body><p>Squad</p></body></html>'))
+        self.assertIsNone(parse_squad_page(SQUAD_PAGE.format(first_id='')))
+
+    def test_no_player_cards(self):
+        with mock.patch('stats.scrape.fetch_page', return_value='<html><body></body></html>'), \
+                mock.patch('stats.scrape.scrape_squad_cards_selenium', return_value=['selenium']) as selenium:
+            with self.settings(SCRAPER_SELENIUM_FALLBACK=False), redirect_stdout(StringIO()) as output:
+                self.assertEqual(scrape_squad_cards(1, 'arsenal'), [])
+            self.assertIn('No player cards in the static squad page of arsenal', output.getvalue())
+            selenium.assert_not_called()
+
+            with self.settings(SCRAPER_SELENIUM_FALLBACK=True), redirect_stdout(StringIO()):
+                self.assertEqual(scrape_squad_cards(1, 'arsenal'), ['selenium'])
+            selenium.assert_called_once_with(1, 'arsenal')
+
+
+@override_settings(PREMIER_LEAGUE_URL='https://www.premierleague.com')
+class ClubIndexParserTests(SimpleTestCase):
+    def test_clubs(self):
+        self.assertEqual(parse_club_index(CLUB_INDEX.format(more='')), [
+            {'id': '1', 'name': 'Arsenal', 'logo': 'https://resources.premierleague.com/badges/50/t3@x2.png'},
+            {'id': '11', 'name': 'Manchester City', 'logo': ''},
+        ])
+
+    def test_twenty_clubs_at_most(self):
+        more = ''.join(
+            f'<li class="club-card-wrapper"><a href="/clubs/{club_id}/Club-{club_id}/overview"></a></li>'
+            for club_id in range(100, 130)
+        )
+        self.assertEqual(len(parse_club_index(CLUB_INDEX.format(more=more))), 20)
+
+    def test_pages_without_clubs(self):
+        self.assertIsNone(parse_club_index('<html><body><p>Clubs</p></body></html>'))
+        self.assertIsNone(parse_club_index(CLUB_INDEX.format(more='<li class="club-card-wrapper">TBC</li>')))
+
+        with mock.patch('stats.scrape.fetch_page', return_value='<html><body></body></html>'), \
+                self.settings(SCRAPER_SELENIUM_FALLBACK=False), redirect_stdout(StringIO()) as output:
+            self.assertEqual(scrape_team_data(refresh=True), [])
+        self.assertIn('No clubs in the static club index page', output.getvalue())
+
+
+class StubDriver:
+    """Stands in for a Chrome WebDriver: BrowserSession only asks for current_url and quits it."""
+
+    def __init__(self):
+        self.crashed = False
+        self.closed = False
+
+    @property
+    def current_url(self):
+        from selenium.common.exceptions import WebDriverException
+
+        if self.crashed or self.closed:
+            raise WebDriverException('chrome not reachable')
+        return 'about:blank'
+
+    def quit(self):
+        self.closed = True
+
+
+class BrowserPoolTests(SimpleTestCase):
+    def pool(self, size=2, max_pages=10):
+        from .browser import BrowserPool
+
+        self.drivers = []
+
+        def driver_factory():
+            self.drivers.append(StubDriver())
+            return self.drivers[-1]
+
+        pool = BrowserPool(size, max_pages, lease_timeout=0.05, driver_factory=driver_factory)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_sessions_are_reused(self):
+        pool = self.pool()
+        with pool.lease() as first:
+            pass
+        with pool.lease() as second:
+            self.assertIs(second, first)
+        # Two leases at once get a browser each
+        with pool.lease() as first, pool.lease() as second:
+            self.assertIsNot(second, first)
+        self.assertEqual(len(self.drivers), 2)
+
+        pool.close()
+        self.assertTrue(all(driver.closed for driver in self.drivers))
+
+    def test_size_limit(self):
+        from .browser import BrowserPoolTimeout
+
+        pool = self.pool(size=1)
+        with pool.lease():
+            with self.assertRaises(BrowserPoolTimeout):
+                with pool.lease():
+                    pass
+        # The slot is free again once the lease is returned
+        with pool.lease() as driver:
+            self.assertIs(driver, self.drivers[0])
+        self.assertEqual(len(self.drivers), 1)
+
+    def test_crashed_drivers_are_replaced(self):
+        pool = self.pool()
+        # Crashed during the lease: not put back
+        with pool.lease() as driver:
+            driver.crashed = True
+        self.assertTrue(driver.closed)
+
+        # Crashed while idle: found on checkout
+        with pool.lease() as replacement:
+            self.assertIsNot(replacement, driver)
+        replacement.crashed = True
+        with pool.lease() as third:
+            self.assertNotIn(third, (driver, replacement))
+        self.assertTrue(replacement.closed)
+        self.assertEqual(len(self.drivers), 3)
+
+    def test_drivers_are_recycled_after_max_pages(self):
+        pool = self.pool(max_pages=2)
+        for _ in range(2):
+            with pool.lease():
+                pass
+        with pool.lease() as driver:
+            self.assertIs(driver, self.drivers[1])
+        self.assertTrue(self.drivers[0].closed)
+
+
+def squad_card(player_id, name, position, nationality):
+    return {
+        'player_id': player_id, 'name': name, 'position': position,
+        'nationality': nationality, 'flag_image': None, 'image': None,
+    }
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PlayerSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        save_teams([
+            {'id': 1, 'name': 'Arsenal', 'logo': ''},
+            {'id': 11, 'name': 'Manchester City', 'logo': ''},
+        ])
+        save_squad(Team.objects.get(id=1), [
+            squad_card(1, 'Martin Ødegaard', 'Midfielder', 'Norway'),
+            squad_card(2, 'Bukayo Saka', 'Forward', 'England'),
+            squad_card(3, 'Declan Rice', 'Midfielder', 'England'),
+        ])
+        save_squad(Team.objects.get(id=11), [
+            squad_card(4, 'Erling Haaland', 'Forward', 'Norway'),
+            squad_card(5, 'Rúben Dias', 'Defender', 'Portugal'),
+        ])
+
+    def names(self, query):
+        return [player['name'] for player in search_players(query)]
+
+    def test_diacritics_are_folded(self):
+        self.assertEqual(self.names('Odegaard'), ['Martin Ødegaard'])
+        self.assertEqual(self.names('ruben'), ['Rúben Dias'])
+
+    def test_terms_match_across_fields(self):
+        self.assertEqual(self.names('arsenal midfielder norway'), ['Martin Ødegaard'])
+        self.assertEqual(self.names('mid eng'), ['Declan Rice'])
+        self.assertCountEqual(self.names('norway'), ['Martin Ødegaard', 'Erling Haaland'])
+
+    def test_prefixes(self):
+        self.assertEqual(self.names('sak'), ['Bukayo Saka'])
+
+    def test_typos_fall_back_to_trigrams(self):
+        self.assertEqual(self.names('haland'), ['Erling Haaland'])
+        self.assertEqual(self.names('odegard'), ['Martin Ødegaard'])
+        self.assertEqual(self.names('zzzz'), [])
+
+    def test_index_follows_renames_and_moves(self):
+        save_teams([{'id': 11, 'name': 'Man City', 'logo': ''}])
+        self.assertEqual(search_players('haaland')[0]['team'], 'Man City')
+
+        save_squad(Team.objects.get(id=1), [squad_card(4, 'Erling Haaland', 'Forward', 'Norway')])
+        self.assertEqual(self.names('arsenal forward norway'), ['Erling Haaland'])
+
+    def test_freshness_saves_leave_the_index_alone(self):
+        generation = caching.generation(caching.SEARCH)
+        player = Player.objects.get(player_id=2)
+        player.save(update_fields=['last_scraped_at', 'expires_at'])
+        self.assertEqual(caching.generation(caching.SEARCH), generation)
+
+        player.nationality = 'Nigeria'
+        player.save(update_fields=['nationality'])
+        self.assertGreater(caching.generation(caching.SEARCH), generation)
+        self.assertEqual(self.names('nigeria'), ['Bukayo Saka'])
+
+    def test_empty_query_lists_everyone_by_name(self):
+        self.assertEqual(self.names('')[:2], ['Bukayo Saka', 'Declan Rice'])
+
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SaveSquadTests(TestCase):
+    def setUp(self):
+        save_teams([{'id': 1, 'name': 'Arsenal', 'logo': ''}, {'id': 11, 'name': 'Manchester City', 'logo': ''}])
+        self.arsenal = Team.objects.get(id=1)
+        self.city = Team.objects.get(id=11)
+        save_squad(self.arsenal, [
+            squad_card(2, 'Bukayo Saka', 'Forward', 'England'),
+            squad_card(3, 'Declan Rice', 'Midfielder', 'England'),
+        ])
+        self.cursor = Change.objects.latest('id').id
+
+    def changes(self):
+        return [
+            (change.kind, change.object_id, change.action)
+            for change in Change.objects.filter(id__gt=self.cursor).order_by('id')
+        ]
+
+    def squad(self, team):
+        return list(Player.objects.filter(team=team).order_by('player_id').values_list('player_id', 'nationality'))
+
+    def test_created(self):
+        save_squad(self.city, [squad_card(4, 'Erling Haaland', 'Forward', 'Norway')])
+        self.assertEqual(self.squad(self.city), [(4, 'Norway')])
+        self.assertEqual(self.changes(), [('player', 4, 'created')])
+
+    def test_updated(self):
+        updated_at = Team.objects.get(id=1).updated_at
+        save_squad(Team.objects.get(id=1), [
+            squad_card(2, 'Bukayo Saka', 'Forward', 'Nigeria'),
+            squad_card(3, 'Declan Rice', 'Midfielder', 'England'),
+        ])
+        self.assertEqual(self.squad(self.arsenal), [(2, 'Nigeria'), (3, 'England')])
+        self.assertEqual(self.changes(), [('player', 2, 'updated')])
+        self.assertGreater(Team.objects.get(id=1).updated_at, updated_at)
+
+    def test_unchanged(self):
+        arsenal = Team.objects.get(id=1)
+        updated_at = arsenal.updated_at
+        save_squad(arsenal, [
+            squad_card(3, 'Declan Rice', 'Midfielder', 'England'),
+            squad_card(2, 'Bukayo Saka', 'Forward', 'England'),
+        ])
+        self.assertEqual(self.changes(), [])
+        self.assertEqual(Team.objects.get(id=1).updated_at, updated_at)
+
+    def test_removed(self):
+        save_squad(Team.objects.get(id=1), [squad_card(3, 'Declan Rice', 'Midfielder', 'England')])
+        self.assertEqual(self.squad(self.arsenal), [(3, 'England')])
+        self.assertEqual(self.changes(), [('player', 2, 'deleted')])
+        self.assertEqual(search_players('saka'), [])
+
+        # A scrape that found no cards at all failed; it doesn't empty the squad
+        save_squad(Team.objects.get(id=1), [])
+        self.assertEqual(self.squad(self.arsenal), [(3, 'England')])
+
+    def test_moved(self):
+        updated_at = Team.objects.get(id=1).updated_at
+        save_squad(self.city, [squad_card(3, 'Declan Rice', 'Midfielder', 'England')])
+        self.assertEqual(self.squad(self.city), [(3, 'England')])
+        self.assertEqual(self.changes(), [('player', 3, 'updated')])
+        # The club he left shows one player fewer
+        self.assertGreater(Team.objects.get(id=1).updated_at, updated_at)
+
+
+class InlineExecutor:
+    """Stands in for update_teams' process pool: runs each club here, inside the test's transaction."""
+
+    def __init__(self, max_workers, mp_context=None, initializer=None):
+        self.max_workers = max_workers
+        self.mp_context = mp_context
+        self.initializer = initializer
+        UpdateTeamsTests.executors.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UpdateTeamsTests(TestCase):
+    SQUADS = {
+        1: [squad_card(2, 'Bukayo Saka', 'Forward', 'England'), squad_card(3, 'Declan Rice', 'Midfielder', 'England')],
+        11: [squad_card(4, 'Erling Haaland', 'Forward', 'Norway')],
+    }
+
+    def setUp(self):
+        cache.clear()
+        UpdateTeamsTests.executors = []
+        self.failing = set()
+        self.squads_scraped, self.players_scraped = [], []
+
+        def scrape_squad_cards(club_id, club_name):
+            self.squads_scraped.append(club_id)
+            return self.SQUADS[club_id]
+
+        def scrape_players_data(players, parse_workers=None):
+            players = list(players)
+            self.players_scraped.append(([player_id for player_id, _ in players], parse_workers))
+            return {
+                player_id: None if player_id in self.failing else {'stats': {'Goals': str(player_id)}}
+                for player_id, _ in players
+            }
+
+        teams = [{'id': '1', 'name': 'Arsenal', 'logo': ''}, {'id': '11', 'name': 'Manchester City', 'logo': ''}]
+        for target, patch in [
+            ('stats.management.commands.update_teams.scrape_team_data', mock.Mock(return_value=teams)),
+            ('stats.management.commands.update_teams.ProcessPoolExecutor', InlineExecutor),
+            ('stats.scrape.scrape_squad_cards', scrape_squad_cards),
+            ('stats.scrape.scrape_players_data', scrape_players_data),
+        ]:
+            patcher = mock.patch(target, patch)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def update(self, **options):
+        call_command('update_teams', skip_images=True, stdout=StringIO(), stderr=StringIO(), **options)
+        return UpdateRun.objects.latest('started_at')
+
+    def test_workers(self):
+        run = self.update(workers=2)
+
+        executor, = self.executors
+        self.assertEqual(executor.max_workers, 2)
+        # Clubs run in fresh processes, never forks sharing this one's sockets and connections
+        self.assertNotEqual(executor.mp_context.get_start_method(), 'fork')
+        self.assertIs(executor.initializer, django.setup)
+        # The workers parse their pages inline
+        self.assertEqual({parse_workers for _, parse_workers in self.players_scraped}, {1})
+        self.assertEqual(Player.objects.exclude(stats={}).count(), 3)
+        self.assertIsNotNone(run.finished_at)
+
+    def test_resume(self):
+        self.failing = {3}
+        run = self.update()
+        self.assertIsNone(run.finished_at)
+        finished = {checkpoint.object_id: checkpoint.completed_at is not None for checkpoint in run.checkpoints.all()}
+        self.assertEqual(finished, {1: False, 11: True})
+
+        # Only the unfinished club is scraped again, and only for the stats that are missing
+        self.failing = set()
+        self.squads_scraped, self.players_scraped = [], []
+        self.assertEqual(self.update(resume=True).pk, run.pk)
+        self.assertEqual(self.squads_scraped, [1])
+        self.assertEqual(self.players_scraped, [([3], None)])
+        self.assertIsNotNone(UpdateRun.objects.get(pk=run.pk).finished_at)
+        self.assertEqual(Player.objects.exclude(stats={}).count(), 3)
+
+
+@override_settings(CACHES=TEST_CACHES, SNAPSHOTS_ENABLED=True)
+class SnapshotTests(TestCase):
+    SQUAD_URL = 'https://www.premierleague.com/clubs/1/arsenal/squad'
+    STATS_URL = 'https://www.premierleague.com/players/2/bukayo-saka/stats'
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(self.settings(SNAPSHOT_DIR=directory.name))
+        self.directory = Path(directory.name)
+
+    def blobs(self):
+        return sorted(path.name for path in self.directory.rglob('*.html.gz'))
+
+    def test_identical_pages_are_stored_once(self):
+        html = PLAYER_PAGES['forward'][0]
+        first = save_snapshot(self.STATS_URL, html)
+        again = save_snapshot(self.STATS_URL, html)
+        self.assertEqual(again.pk, first.pk)
+        self.assertGreater(PageSnapshot.objects.get(pk=first.pk).last_seen_at, first.last_seen_at)
+
+        # The same content under another URL shares the blob
+        other = save_snapshot('https://www.premierleague.com/players/2/saka/stats', html)
+        self.assertEqual(other.digest, first.digest)
+        self.assertEqual(self.blobs(), [f'{first.digest}.html.gz'])
+        self.assertEqual(read_blob(first.digest), html)
+
+        # Changed content is a new snapshot of the URL
+        changed = save_snapshot(self.STATS_URL, PLAYER_PAGES['goalkeeper'][0])
+        self.assertNotEqual(changed.digest, first.digest)
+        self.assertEqual(PageSnapshot.objects.count(), 3)
+        self.assertEqual(len(self.blobs()), 2)
+
+    def test_reparse(self):
+        save_teams([{'id': 1, 'name': 'Arsenal', 'logo': ''}])
+        arsenal = Team.objects.get(id=1)
+        save_squad(arsenal, [squad_card(2, 'Bukayo Saka', 'Forward', 'England')])
+        expires_at = Team.objects.get(id=1).expires_at
+        save_snapshot(self.SQUAD_URL, SQUAD_PAGE.format(first_id=2))
+        save_snapshot(self.STATS_URL, PLAYER_PAGES['forward'][0])
+
+        with redirect_stdout(StringIO()):
+            call_command('reparse', workers=1, stdout=StringIO())
+
+        saka = Player.objects.get(player_id=2)
+        self.assertEqual(saka.stats, PLAYER_PAGES['forward'][1]['stats'])
+        self.assertEqual(saka.image, 'https://resources.premierleague.com/photos/p223340.png')
+        self.assertEqual(
+            list(PlayerStat.objects.filter(player=saka, name='Goals').values_list('value', flat=True)), [49]
+        )
+        self.assertTrue(Player.objects.filter(player_id=8, team=arsenal).exists())
+        # Re-parsing is not a scrape: the next refresh is still due when the last scrape said
+        self.assertIsNone(saka.expires_at)
+        self.assertEqual(Team.objects.get(id=1).expires_at, expires_at)
+
+
+@override_settings(CACHES=TEST_CACHES, LEADERBOARD_SYNC_INTERVAL=0)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        save_teams([{'id': 1, 'name': 'Arsenal', 'logo': ''}])
+        players = save_squad(Team.objects.get(id=1), [
+            squad_card(2, 'Bukayo Saka', 'Forward', 'England'),
+            squad_card(3, 'Declan Rice', 'Midfielder', 'England'),
+        ])
+        save_player_stats({players[0]: {'stats': {'Goals': '49'}}, players[1]: {'stats': {'Goals': '10'}}})
+        # Not the store the signals update, like the store of another process
+        self.store = LeaderboardStore()
+        self.store.build()
+
+    def ranking(self, **filters):
+        return [(entry['name'], entry['value']) for entry in self.store.top('Goals', **filters)]
+
+    def test_other_processes_writes_are_applied_incrementally(self):
+        save_player_stats({Player.objects.get(player_id=3): {'stats': {'Goals': '60'}}})
+        # The new change ids, the changed player and their stat rows; no rebuild
+        with self.assertNumQueries(3):
+            self.assertEqual(self.ranking(), [('Declan Rice', 60), ('Bukayo Saka', 49)])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.ranking(position='midfielder'), [('Declan Rice', 60)])
+
+    def test_renames_and_departures(self):
+        save_teams([{'id': 1, 'name': 'Arsenal FC', 'logo': ''}])
+        save_squad(Team.objects.get(id=1), [squad_card(3, 'Declan Rice', 'Midfielder', 'England')])
+        entries = self.store.top('Goals')
+        self.assertEqual([(entry['name'], entry['team']) for entry in entries], [('Declan Rice', 'Arsenal FC')])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        save_teams([{'id': 1, 'name': 'Arsenal', 'logo': ''}, {'id': 11, 'name': 'Manchester City', 'logo': ''}])
+        arsenal = save_squad(Team.objects.get(id=1), [
+            squad_card(2, 'Bukayo Saka', 'Forward', 'England'),
+            squad_card(3, 'Declan Rice', 'Midfielder', 'England'),
+            squad_card(1, 'Martin Ødegaard', 'Midfielder', 'Norway'),
+        ])
+        save_squad(Team.objects.get(id=11), [squad_card(4, 'Erling Haaland', 'Forward', 'Norway')])
+        save_player_stats({arsenal[0]: {'stats': {'Appearances': '178', 'Attack - Goals': '49'}}})
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def names(self, url, **params):
+        return [player['name'] for player in self.get(url, **params)['results']]
+
+    def test_default_fields_leave_out_the_stats(self):
+        player = self.get('/api/v1/players/2/')
+        self.assertNotIn('stats', player)
+        self.assertEqual((player['team'], player['team_name'], player['position']), (1, 'Arsenal', 'Forward'))
+
+    def test_sparse_fields(self):
+        self.assertEqual(self.get('/api/v1/players/2/', fields='name,stats'), {
+            'name': 'Bukayo Saka', 'stats': {'Appearances': '178', 'Attack - Goals': '49'},
+        })
+        # Only the columns of the requested fields (and the cursor's ordering) are read
+        with CaptureQueriesContext(connection) as queries:
+            self.get('/api/v1/players/', fields='name')
+        self.assertNotIn('"nationality"', queries[0]['sql'])
+        self.assertEqual(self.client.get('/api/v1/players/', {'fields': 'name,salary'}).status_code, 400)
+
+    def test_cursor_pagination(self):
+        first = self.get('/api/v1/players/', limit=3, fields='name')
+        self.assertEqual([player['name'] for player in first['results']], ['Bukayo Saka', 'Declan Rice', 'Erling Haaland'])
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(second['results'], [{'name': 'Martin Ødegaard'}])
+        self.assertIsNone(second['next'])
+
+    def test_filters(self):
+        self.assertEqual(self.names('/api/v1/players/', team='1', position='midfielder'), ['Declan Rice', 'Martin Ødegaard'])
+        self.assertEqual(self.names('/api/v1/players/', team='manchester-city'), ['Erling Haaland'])
+        self.assertEqual(self.names('/api/v1/teams/11/squad/'), ['Erling Haaland'])
+
+        stats = self.get('/api/v1/stats/', team='Arsenal', category='attack')['results']
+        self.assertEqual(stats, [{'player': 2, 'category': 'Attack', 'name': 'Goals', 'value': 49.0, 'season': 'all'}])
+        self.assertEqual([row['name'] for row in self.get('/api/v1/players/2/stats/')['results']], ['Appearances', 'Goals'])
+
+    def test_changes_by_kind(self):
+        changes = self.get('/api/changes/', kind='team', limit=1)
+        self.assertEqual([(change['kind'], change['object_id']) for change in changes['results']], [('team', 1)])
+        self.assertTrue(changes['has_more'])
+        rest = self.get('/api/changes/', kind='team', since=changes['cursor'])
+        self.assertEqual([change['object_id'] for change in rest['results']], [11])
+        self.assertFalse(rest['has_more'])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ChangeLogTests(TestCase):
+    def setUp(self):
+        save_teams([{'id': 1, 'name': 'Arsenal', 'logo': ''}])
+        self.team = Team.objects.get(id=1)
+        self.players = save_squad(self.team, [squad_card(2, 'Bukayo Saka', 'Forward', 'England')])
+
+    def changes(self, since=0, **params):
+        return self.client.get('/api/changes/', {'since': since, **params}).json()
+
+    def test_unchanged_scrapes_are_not_logged(self):
+        before = Change.objects.count()
+        save_teams([{'id': 1, 'name': 'Arsenal', 'logo': ''}])
+        save_squad(self.team, [squad_card(2, 'Bukayo Saka', 'Forward', 'England')])
+        self.assertEqual(Change.objects.count(), before)
+
+    def test_squad_and_player_pages_agree_on_the_position(self):
+        player = self.players[0]
+        save_player_details(player, {
+            'name': 'Bukayo Saka', 'position': 'forward', 'nationality': 'England', 'flag_image': None, 'stats': {},
+        })
+        before = Change.objects.count()
+        save_squad(self.team, [squad_card(2, 'Bukayo Saka', 'Forward', 'England')])
+        self.assertEqual(Change.objects.count(), before)
+        self.assertEqual(Player.objects.get(player_id=2).position, 'Forward')
+
+    def test_reparsed_pages_leave_freshness_alone(self):
+        expires_at = Team.objects.get(id=1).expires_at
+        player = Player.objects.get(player_id=2)
+        changed = save_players_details({player: {
+            'name': 'Bukayo Saka', 'position': 'forward', 'nationality': 'Nigeria', 'flag_image': None,
+            'stats': {'Goals': '49'},
+        }}, scraped=False)
+        save_squad(self.team, [squad_card(2, 'Bukayo Saka', 'Forward', 'Nigeria')], scraped=False)
+
+        self.assertEqual(changed, [player])
+        player = Player.objects.get(player_id=2)
+        self.assertEqual((player.nationality, player.stats), ('Nigeria', {'Goals': '49'}))
+        self.assertIsNone(player.expires_at)
+        self.assertEqual(Team.objects.get(id=1).expires_at, expires_at)
+
+    def test_changes_are_logged_with_the_new_content(self):
+        player = self.players[0]
+        save_player_stats({player: {'stats': {'Goals': '49'}}})
+        player.delete()
+
+        actions = [(change.kind, change.object_id, change.action) for change in Change.objects.order_by('id')]
+        self.assertEqual(actions, [
+            ('team', 1, 'created'), ('player', 2, 'created'), ('player', 2, 'updated'), ('player', 2, 'deleted'),
+        ])
+        updated = Change.objects.get(action=Change.UPDATED)
+        self.assertEqual(updated.data['stats'], {'Goals': '49'})
+        self.assertEqual(updated.version, player.version)
+
+    def test_sync_from_a_cursor(self):
+        first = self.changes(limit=1)
+        self.assertEqual([change['kind'] for change in first['results']], ['team'])
+        self.assertTrue(first['has_more'])
+
+        rest = self.changes(first['cursor'])
+        self.assertEqual([change['object_id'] for change in rest['results']], [2])
+        self.assertFalse(rest['has_more'])
+
+        save_teams([{'id': 1, 'name': 'Arsenal FC', 'logo': ''}])
+        latest = self.changes(rest['cursor'])
+        self.assertEqual([change['data']['name'] for change in latest['results']], ['Arsenal FC'])
+        self.assertEqual(self.changes(latest['cursor'])['results'], [])
+
+    def test_bad_cursor(self):
+        self.assertEqual(self.client.get('/api/changes/', {'since': 'abc'}).status_code, 400)
+
+
+
+@override_settings(SCRAPE_JOB_MAX_ATTEMPTS=2, SCRAPE_JOB_RETRY_DELAY=30, SCRAPE_JOB_LOCK_TIMEOUT=60)
+class ScrapeJobTests(TestCase):
+    def test_enqueue_deduplicates_active_jobs(self):
+        job = jobs.enqueue('squad', 1, 'arsenal')
+        again = jobs.enqueue('squad', 1, 'arsenal', priority=jobs.PRIORITY_HIGH)
+        self.assertEqual(again.pk, job.pk)
+        # A request waiting on the data raises the queued job's priority
+        self.assertEqual(ScrapeJob.objects.get(pk=job.pk).priority, jobs.PRIORITY_HIGH)
+
+        ScrapeJob.objects.filter(pk=job.pk).update(status=ScrapeJob.DONE)
+        self.assertNotEqual(jobs.enqueue('squad', 1, 'arsenal').pk, job.pk)
+        self.assertEqual(ScrapeJob.objects.filter(key='squad:1').count(), 2)
+
+    def test_claim_takes_priority_then_the_oldest(self):
+        later = jobs.enqueue('player', 1, 'a')
+        ScrapeJob.objects.filter(pk=later.pk).update(run_after=timezone.now() - timedelta(seconds=5))
+        latest = jobs.enqueue('player', 2, 'b')
+        urgent = jobs.enqueue('player', 3, 'c', priority=jobs.PRIORITY_HIGH)
+        ScrapeJob.objects.create(kind='player', key='player:4', args=[4, 'd'], run_after=timezone.now() + timedelta(hours=1))
+
+        claimed = [jobs.claim('worker') for _ in range(4)]
+        self.assertEqual([job and job.pk for job in claimed], [urgent.pk, later.pk, latest.pk, None])
+        self.assertEqual((claimed[0].status, claimed[0].locked_by, claimed[0].attempts), (ScrapeJob.RUNNING, 'worker', 1))
+
+    def test_failures_are_retried_with_backoff(self):
+        job = jobs.enqueue('teams')
+        with mock.patch.dict(jobs.HANDLERS, {'teams': mock.Mock(side_effect=RuntimeError('upstream down'))}):
+            self.assertFalse(jobs.run(jobs.claim('worker')))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.locked_by), (ScrapeJob.PENDING, 1, ''))
+            self.assertIn('upstream down', job.last_error)
+            delay = (job.run_after - timezone.now()).total_seconds()
+            self.assertTrue(30 * 0.8 - 1 < delay <= 30 * 1.2, delay)
+            self.assertIsNone(jobs.claim('worker'))
+
+            ScrapeJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertFalse(jobs.run(jobs.claim('worker')))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (ScrapeJob.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_jobs_of_dead_workers_are_taken_over(self):
+        job = jobs.enqueue('teams')
+        self.assertEqual(jobs.claim('dead-worker').pk, job.pk)
+        self.assertIsNone(jobs.claim('worker'))
+
+        ScrapeJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=61))
+        claimed = jobs.claim('worker')
+        self.assertEqual((claimed.pk, claimed.locked_by, claimed.attempts), (job.pk, 'worker', 2))
+
+    def test_prune_keeps_active_and_recent_jobs(self):
+        now = timezone.now()
+        old = now - settings.SCRAPE_JOB_RETENTION - timedelta(minutes=1)
+        for key, status, finished_at in [
+            ('teams', ScrapeJob.DONE, old), ('squad:1', ScrapeJob.FAILED, old),
+            ('squad:2', ScrapeJob.DONE, now), ('squad:3', ScrapeJob.PENDING, None),
+        ]:
+            ScrapeJob.objects.create(kind=key.split(':')[0], key=key, status=status, run_after=now, finished_at=finished_at)
+
+        self.assertEqual(jobs.prune(), 2)
+        self.assertCountEqual(ScrapeJob.objects.values_list('key', flat=True), ['squad:2', 'squad:3'])
+
+
+@override_settings(SINGLE_FLIGHT_POLL_INTERVAL=0)
+class SingleFlightTests(TestCase):
+    key = 'squad:1'
+
+    def lock(self):
+        return ScrapeLock.objects.get(key=self.key)
+
+    def test_owner_runs_and_releases(self):
+        self.assertEqual(single_flight(self.key, lambda team_id: {'team': team_id}, 1), {'team': 1})
+        lock = self.lock()
+        self.assertEqual((lock.owner, lock.expires_at, lock.result), ('', None, {'team': 1}))
+
+        with self.assertRaises(RuntimeError):
+            single_flight(self.key, mock.Mock(side_effect=RuntimeError('scrape failed')))
+        self.assertEqual(self.lock().owner, '')
+
+    def test_later_callers_wait_and_reuse_the_result(self):
+        self.assertTrue(singleflight.acquire(self.key, 'other-worker'))
+        scrape = mock.Mock()
+
+        # The holder finishes while the second caller polls
+        def holder_finishes(seconds):
+            singleflight.release(self.key, 'other-worker', {'players': 25})
+
+        with mock.patch('stats.singleflight.time.sleep', side_effect=holder_finishes):
+            self.assertEqual(single_flight(self.key, scrape), {'players': 25})
+        scrape.assert_not_called()
+
+        self.assertTrue(singleflight.acquire(self.key, 'other-worker'))
+        with mock.patch('stats.singleflight.time.sleep', side_effect=holder_finishes):
+            self.assertEqual(single_flight(self.key, scrape, reuse=lambda: 'from the database'), 'from the database')
+        scrape.assert_not_called()
+
+    def test_expired_locks_are_taken_over(self):
+        ScrapeLock.objects.create(key=self.key, owner='dead-worker', expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(single_flight(self.key, lambda: 'scraped'), 'scraped')
+        self.assertEqual(self.lock().owner, '')
+
+    def test_gives_up_on_a_live_holder(self):
+        self.assertTrue(singleflight.acquire(self.key, 'other-worker'))
+        self.assertFalse(singleflight.acquire(self.key, 'worker'))
+        with self.assertRaises(singleflight.SingleFlightTimeout):
+            single_flight(self.key, lambda: 'scraped', timeout=0)
+        self.assertEqual(self.lock().owner, 'other-worker')
+
+
+@override_settings(
+    SCRAPER_RATE_MAX=100, SCRAPER_RATE_MIN=1, SCRAPER_RATE_BURST=10, SCRAPER_RATE_INCREASE=1,
+    SCRAPER_RATE_DECREASE=0.5, SCRAPER_RETRY_DELAY=0, SCRAPER_CIRCUIT_FAILURES=3, CACHES=TEST_CACHES,
+)
+class ThrottleTests(TestCase):
+    host = 'upstream.test'
+    url = f'http://{host}/players/1/stats'
+
+    def responses(self, *statuses):
+        responses = iter(SimpleNamespace(status_code=status, headers={}) for status in statuses)
+        return lambda: next(responses)
+
+    def state(self):
+        return HostThrottle.objects.get(host=self.host)
+
+    def test_rate_backs_off_multiplicatively_and_recovers_additively(self):
+        throttle.call(self.url, self.responses(200))
+        self.assertEqual(self.state().rate, 100)
+
+        throttle.record(self.host, 429, 0.1)
+        self.assertEqual(self.state().rate, 50)
+        throttle.record(self.host, 200, 10)  # slow
+        self.assertEqual(self.state().rate, 25)
+        throttle.record(self.host, 200, 0.1)
+        self.assertEqual(self.state().rate, 26)
+
+    def test_retries_until_success(self):
+        response = throttle.call(self.url, self.responses(503, 429, 200))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.state().failures, 0)
+
+    def test_gives_up_after_the_last_retry(self):
+        with self.settings(SCRAPER_FETCH_RETRIES=1):
+            self.assertEqual(throttle.call(self.url, self.responses(503, 502)).status_code, 502)
+        self.assertEqual(throttle.call(self.url, self.responses(404)).status_code, 404)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        for _ in range(3):
+            throttle.record(self.host, None, 0.1)
+        with self.assertRaises(throttle.CircuitOpen):
+            throttle.call(self.url, self.responses(200))
+
+    def test_retry_after_opens_the_circuit(self):
+        response = SimpleNamespace(status_code=429, headers={'Retry-After': '120'})
+        self.assertEqual(throttle.call(self.url, lambda: response), response)
+        self.assertEqual(self.state().rate, 1)
+        with self.assertRaises(throttle.CircuitOpen):
+            throttle.acquire(self.host)
+
+
+
+def png(width, height, color='red'):
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new('RGB', (width, height), color).save(output, format='PNG')
+    return output.getvalue()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ImageProxyTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(self.settings(IMAGE_DIR=directory.name, IMAGE_SIZES={'thumb': (50, 50)}))
+
+    def test_identical_images_are_stored_once(self):
+        first = images.store('https://example.com/flags/ENG.png', png(200, 100), 'image/png')
+        second = images.store('https://example.com/flags/eng-2x.png', png(200, 100), 'image/png')
+        self.assertEqual(first, second)
+        self.assertEqual(images.media_url('https://example.com/flags/ENG.png'), f'/media/full/{first}')
+        self.assertIsNone(images.store('https://example.com/flag.svg', b'<svg/>', 'image/svg+xml'))
+
+    def test_variants_are_served_for_good(self):
+        name = images.store('https://example.com/photos/p1.png', png(200, 100), 'image/png')
+        response = self.client.get(images.media_url('https://example.com/photos/p1.png', 'thumb'))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        from PIL import Image
+
+        with Image.open(BytesIO(b''.join(response.streaming_content))) as thumb:
+            self.assertEqual(thumb.size, (50, 25))
+        self.assertEqual(self.client.get(f'/media/huge/{name}').status_code, 404)
+        self.assertEqual(self.client.get(f'/media/full/{"0" * 64}.png').status_code, 404)
+
+    def test_images_not_prefetched_go_through_a_signed_url(self):
+        url = images.media_url('https://example.com/photos/p2.png')
+        self.assertTrue(url.startswith('/media/full/fetch/'))
+        self.assertEqual(self.client.get(url + 'x').status_code, 404)
+        self.assertEqual(images.media_url('/photos/p2.png'), '/photos/p2.png')
+
+    def run_jobs(self):
+        while job := jobs.claim('tests'):
+            jobs.run(job)
+
+    def test_images_are_downloaded_in_the_background(self):
+        photo = 'https://example.com/photos/p3.png'
+        url = images.media_url(photo)
+        with mock.patch('stats.upstream.fetch_image', return_value=(png(20, 20), 'image/png')) as fetch_image:
+            # The request doesn't wait for upstream: it queues the download and sends the browser there
+            self.assertRedirects(self.client.get(url), photo, fetch_redirect_response=False)
+            fetch_image.assert_not_called()
+            self.run_jobs()
+        fetch_image.assert_called_once_with(photo)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+
+    def test_images_that_cant_be_stored_redirect_upstream(self):
+        crest = 'https://example.com/crests/t3.svg'
+        url = images.media_url(crest)
+        with mock.patch('stats.upstream.fetch_image', return_value=(b'<svg/>', 'image/svg+xml')) as fetch_image:
+            for _ in range(2):
+                response = self.client.get(url)
+                self.assertRedirects(response, crest, fetch_redirect_response=False)
+                self.assertIn('max-age=600', response['Cache-Control'])
+                self.run_jobs()
+        # The failure is remembered: one upstream fetch, not one per page view
+        fetch_image.assert_called_once_with(crest)
+        self.assertEqual(ScrapeJob.objects.count(), 1)
+
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            save_teams([{'id': 1, 'name': 'Arsenal', 'logo': ''}])
+            self.team = Team.objects.get(id=1)
+            save_squad(self.team, [squad_card(2, 'Bukayo Saka', 'Forward', 'England')])
+        # As a scrape of the club list leaves it
+        cache.set(caching.cache_key(caching.TEAMS, 'fresh'), True)
+
+    def test_hot_pages_need_no_queries(self):
+        for url in ['/api/team/1/', '/api/teams/']:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_pages_follow_the_data(self):
+        self.assertContains(self.client.get('/api/team/1/'), 'England')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_squad(self.team, [
+                squad_card(2, 'Bukayo Saka', 'Forward', 'Nigeria'),
+                squad_card(3, 'Declan Rice', 'Midfielder', 'England'),
+            ])
+        response = self.client.get('/api/team/1/')
+        self.assertContains(response, 'Nigeria')
+        self.assertContains(response, 'Declan Rice')
+        self.assertNotContains(response, 'Forward (England)')
+
+    def test_player_details_move_the_team_page(self):
+        first = self.client.get('/api/team/1/')
+        player = Player.objects.get(player_id=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            save_player_details(player, {
+                'name': 'Bukayo Saka', 'position': 'Forward', 'nationality': 'Nigeria', 'flag_image': None, 'stats': {},
+            })
+        self.assertEqual(self.client.get('/api/team/1/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+        self.assertContains(self.client.get('/api/team/1/'), 'Nigeria')
+
+    def test_validators_are_forgotten_on_direct_saves(self):
+        self.client.get('/api/team/1/')
+        key = caching.cache_key(caching.VALIDATORS, caching.SQUAD, 1)
+        self.assertIn(key, cache)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.save()
+        self.assertNotIn(key, cache)
+
+    def test_expired_club_list_is_refreshed_on_revalidation(self):
+        first = self.client.get('/api/teams/')
+        self.assertFalse(ScrapeJob.objects.exists())
+
+        cache.delete(caching.cache_key(caching.TEAMS, 'fresh'))
+        response = self.client.get('/api/teams/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(list(ScrapeJob.objects.values_list('key', 'status')), [('teams', ScrapeJob.PENDING)])
+
+    def test_validators_skip_the_front_layer(self):
+        self.client.get('/api/team/1/')
+        # Another process expires the squad and forgets the row in the shared layer
+        Team.objects.filter(pk=1).update(expires_at=timezone.now() - timedelta(hours=1))
+        caches['shared'].delete(caching.cache_key(caching.VALIDATORS, caching.SQUAD, 1))
+        self.client.get('/api/team/1/')
+        self.assertTrue(ScrapeJob.objects.filter(key=jobs.job_key('squad', 1, 'Arsenal')).exists())
+
+    def test_expired_pages_queue_one_refresh(self):
+        Team.objects.filter(pk=1).update(expires_at=timezone.now() - timedelta(hours=1))
+        first = self.client.get('/api/team/1/')
+        self.assertEqual(ScrapeJob.objects.count(), 1)
+        # A queued refresh is found with a read, and no job is written again
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/team/1/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(ScrapeJob.objects.count(), 1)
+
+    def test_incomplete_players_are_not_requeued_after_a_scrape(self):
+        player = Player.objects.get(player_id=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            save_player_stats({player: {'stats': {'Goals': '10'}}})
+        # No flag on the page: the player is queued for its details
+        self.client.get('/api/player/2/bukayo-saka/')
+        job = ScrapeJob.objects.get()
+        self.assertEqual(job.key, jobs.job_key('player', 2))
+
+        # Scraped, still without a flag upstream: not queued again until the data expires
+        ScrapeJob.objects.filter(pk=job.pk).update(status=ScrapeJob.DONE, finished_at=timezone.now())
+        self.client.get('/api/player/2/bukayo-saka/')
+        self.assertEqual(ScrapeJob.objects.count(), 1)
+
+
+def metric_value(metric, **labels):
+    return sum(value for _, sample_labels, value in metric.samples() if sample_labels == labels)
+
+
+def timed_queries(response):
+    # The query count MetricsMiddleware reports in the db entry of Server-Timing
+    return int(re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response['Server-Timing']).group(1))
+
+
+@override_settings(CACHES=TEST_CACHES, METRICS_SERVER_TIMING=True)
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        save_teams([{'id': 1, 'name': 'Arsenal', 'logo': ''}])
+        save_squad(Team.objects.get(id=1), [squad_card(2, 'Bukayo Saka', 'Forward', 'England')])
+
+    def assertMeasured(self, response, requests, queries):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(metric_value(metrics.requests_total, view='team_detail', status='200'), requests + 1)
+        self.assertGreater(timed_queries(response), 0)
+        self.assertEqual(metric_value(metrics.db_queries_total, view='team_detail'), queries + timed_queries(response))
+        timings = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        self.assertEqual(sorted(timings), ['db', 'render', 'total'])
+
+    def test_sync_requests(self):
+        requests = metric_value(metrics.requests_total, view='team_detail', status='200')
+        queries = metric_value(metrics.db_queries_total, view='team_detail')
+        self.assertMeasured(self.client.get('/api/team/1/'), requests, queries)
+
+    async def test_async_requests(self):
+        # The async view's queries run on a sync_to_async thread, not the middleware's
+        requests = metric_value(metrics.requests_total, view='team_detail', status='200')
+        queries = metric_value(metrics.db_queries_total, view='team_detail')
+        self.assertMeasured(await self.async_client.get('/api/team/1/'), requests, queries)
+
+    def test_server_timing_is_optional(self):
+        with self.settings(METRICS_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get('/api/team/1/'))
+
+    def test_metrics_page(self):
+        self.client.get('/api/team/1/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE stats_request_seconds histogram', lines)
+        self.assertIn('# TYPE stats_requests_total counter', lines)
+        requests = metric_value(metrics.requests_total, view='team_detail', status='200')
+        self.assertIn(f'stats_requests_total{{view="team_detail",status="200"}} {requests}', lines)
+        self.assertTrue(any(line.startswith('stats_request_seconds_bucket{view="team_detail",le="+Inf"}') for line in lines))
+
+        with self.settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_reads_fill_the_front_layer(self):
+        caches['shared'].set('key', 'shared value')
+        self.assertEqual(cache.get('key'), 'shared value')
+        # Served from the front layer now, even though the shared entry changed underneath
+        caches['shared'].set('key', 'newer value')
+        self.assertEqual(cache.get('key'), 'shared value')
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+
+    def test_writes_and_deletes_reach_both_layers(self):
+        cache.set('key', {'a': 1})
+        self.assertEqual(caches['shared'].get('key'), {'a': 1})
+        cache.delete('key')
+        self.assertIsNone(caches['shared'].get('key'))
+        self.assertIsNone(cache.get('key'))
+
+    def test_values_are_copies(self):
+        cache.set('key', {'a': 1})
+        cache.get('key')['a'] = 2
+        self.assertEqual(cache.get('key'), {'a': 1})
+
+    def test_front_layer_expires_and_evicts(self):
+        cache.set('key', 'value', timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('key'))
+
+        for key in ['a', 'b', 'c', 'd']:
+            caches['shared'].set(key, key)
+            cache.get(key)
+        caches['shared'].set('a', 'changed')
+        # LOCAL_MAX_ENTRIES is 3: the least recently used entry went back to the shared layer
+        self.assertEqual(cache.get('a'), 'changed')
+
+    def test_threads_share_the_front_layer(self):
+        cache.set('key', 'old')
+        self.assertEqual(cache.get('key'), 'old')
+        caches['shared'].set('key', 'new')
+
+        # Each thread gets its own backend object; a delete made in one is seen by the others
+        thread = threading.Thread(target=cache.delete, args=['key'])
+        thread.start()
+        thread.join()
+        self.assertIsNone(cache.get('key'))
+
+
+# What a web worker pays before serving its first request: django.setup() plus loading the URLconf
+STARTUP_SCRIPT = """
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'football_stats.settings')
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import resolve
+resolve('/api/')
+resolve('/api/v1/players/')
+print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))
+"""
+
+# Measured at about 0.4s; the scraping stack used to add about 0.25s on top
+STARTUP_BUDGET_SECONDS = 1.0
+
+# Only scrape jobs and management commands need these
+SCRAPING_MODULES = ('selenium', 'webdriver_manager', 'bs4', 'lxml', 'stats.scrape', 'stats.browser')
+
+
+class StartupTests(SimpleTestCase):
+    def start(self):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output)
+
+    def test_scraping_stack_is_not_imported(self):
+        modules = self.start()['modules']
+        loaded = [module for module in modules if module in SCRAPING_MODULES or module.split('.')[0] in SCRAPING_MODULES]
+        self.assertEqual(loaded, [])
+
+    def test_startup_within_budget(self):
+        # Best of three, so a busy machine doesn't fail the run
+        seconds = min(self.start()['seconds'] for _ in range(3))
+        self.assertLess(seconds, STARTUP_BUDGET_SECONDS)
@@ -0,0 +1,146 @@
+import random
+import time
+import urllib.parse
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+from .models import HostThrottle
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+# Responses that mean the host is rate limiting us or struggling: back off and retry
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def host_of(url):
+    return urllib.parse.urlsplit(url).netloc
+
+
+def load(host, now):
+    throttle, _ = HostThrottle.objects.get_or_create(host=host, defaults={
+        'rate': settings.SCRAPER_RATE_MAX, 'tokens': settings.SCRAPER_RATE_BURST, 'refilled_at': now,
+    })
+    # Settings may have changed since the row was written
+    throttle.rate = min(max(throttle.rate, settings.SCRAPER_RATE_MIN), settings.SCRAPER_RATE_MAX)
+    return throttle
+
+
+def acquire(host):
+    """
+    Take a token from the host's bucket, waiting for one if it is empty.
+
+    The bucket lives in the database, so threads and processes share it; each check is one
+    short write transaction. Raises CircuitOpen while the host's circuit breaker is open.
+    """
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            throttle = load(host, now)
+            if throttle.open_until and throttle.open_until > now:
+                metrics.upstream_rejected_total.inc(host=host)
+                raise CircuitOpen(f"Not fetching from {host} before {throttle.open_until:%H:%M:%S}")
+
+            elapsed = max(0.0, (now - throttle.refilled_at).total_seconds())
+            throttle.tokens = min(settings.SCRAPER_RATE_BURST, throttle.tokens + elapsed * throttle.rate)
+            throttle.refilled_at = now
+            if throttle.tokens >= 1:
+                throttle.tokens -= 1
+                throttle.save()
+                return
+            wait = (1 - throttle.tokens) / throttle.rate
+        time.sleep(wait)
+
+
+def record(host, status, seconds, retry_after=None):
+    """
+    Adapt the host's rate to a response (status None: no response at all).
+
+    Good responses add SCRAPER_RATE_INCREASE to the rate; failures, 429s, 5xx and slow
+    responses multiply it by SCRAPER_RATE_DECREASE. SCRAPER_CIRCUIT_FAILURES failures in a
+    row, or a Retry-After, open the circuit: when it closes again one token is available, so
+    a single probe goes out at the minimum rate and its result decides what happens next.
+    """
+    failed = status is None or status in RETRY_STATUSES
+    metrics.upstream_requests_total.inc(host=host, status='error' if status is None else str(status))
+
+    with transaction.atomic():
+        now = timezone.now()
+        throttle = load(host, now)
+        if failed or seconds > settings.SCRAPER_SLOW_RESPONSE:
+            throttle.rate = max(settings.SCRAPER_RATE_MIN, throttle.rate * settings.SCRAPER_RATE_DECREASE)
+        else:
+            throttle.rate = min(settings.SCRAPER_RATE_MAX, throttle.rate + settings.SCRAPER_RATE_INCREASE)
+
+        if not failed:
+            throttle.failures = 0
+            throttle.open_until = None
+        else:
+            throttle.failures += 1
+            cooldown = retry_after or 0
+            if throttle.failures >= settings.SCRAPER_CIRCUIT_FAILURES:
+                cooldown = max(cooldown, settings.SCRAPER_CIRCUIT_COOLDOWN)
+            if cooldown:
+                throttle.open_until = now + timedelta(seconds=cooldown)
+                throttle.rate = settings.SCRAPER_RATE_MIN
+                throttle.tokens = 1
+                throttle.refilled_at = throttle.open_until
+        throttle.save()
+
+
+def retry_after(response):
+    """Seconds the response's Retry-After header asks for, if any."""
+    value = getattr(response, 'headers', {}).get('Retry-After')
+    if not value:
+        return None
+    if value.isdigit():
+        return int(value)
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def call(url, request, status=lambda response: response.status_code):
+    """
+    Run request() for `url` under its host's rate limiter and return the response.
+
+    Exceptions and RETRY_STATUSES are retried up to SCRAPER_FETCH_RETRIES times with jittered
+    exponential backoff; the last response (or exception) is what the caller gets. `status`
+    reads the status code from a response, for clients like Selenium that don't expose one.
+    """
+    host = host_of(url)
+    for attempt in range(settings.SCRAPER_FETCH_RETRIES + 1):
+        acquire(host)
+        started = time.perf_counter()
+        try:
+            response = request()
+        except Exception:
+            record(host, None, time.perf_counter() - started)
+            if attempt == settings.SCRAPER_FETCH_RETRIES:
+                raise
+            wait_for = None
+        else:
+            code = status(response)
+            wait_for = retry_after(response) if code in RETRY_STATUSES else None
+            record(host, code, time.perf_counter() - started, wait_for)
+            if code not in RETRY_STATUSES or attempt == settings.SCRAPER_FETCH_RETRIES:
+                return response
+
+        # Full jitter keeps the scrapers that failed together from retrying together
+        delay = max(random.uniform(0, settings.SCRAPER_RETRY_DELAY * 2 ** attempt), wait_for or 0)
+        if delay > settings.SCRAPER_RETRY_MAX_DELAY:
+            if wait_for is None:
+                delay = settings.SCRAPER_RETRY_MAX_DELAY
+            else:
+                # The host asked for a longer break than is worth holding a worker for
+                return response
+        metrics.upstream_retries_total.inc(host=host)
+        time.sleep(delay)
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import throttle
+from .metrics import instrumented
+
+
+# HTTP access to the scraped site, without the parsers: image downloads need only this module
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    # One keep-alive session per process, with a connection pool big enough for the batch fetchers
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                session.headers.update({'User-Agent': 'Mozilla/5.0'})
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.SCRAPER_HTTP_CONCURRENCY)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _http_session = session
+    return _http_session
+
+
+def get(url):
+    # Rate limited per host, with retries for 429s, 5xx and connection errors
+    return throttle.call(url, lambda: get_http_session().get(url, timeout=settings.SCRAPER_HTTP_TIMEOUT))
+
+
+@instrumented('fetch')
+def fetch_image(url):
+    """The bytes and Content-Type of an upstream image, or None."""
+    try:
+        response = get(url)
+        if response.status_code != 200:
+            print(f"Failed to retrieve {url}, status code: {response.status_code}")
+            return None
+        return response.content, response.headers.get('Content-Type', '')
+    except Exception as e:
+        print(f"Error fetching {url}: {e}")
+        return None
+
+
+def fetch_images(urls):
+    """fetch_image() for many URLs at once, over the shared session; a dict of url -> result."""
+    urls = list(urls)
+    with ThreadPoolExecutor(max_workers=settings.SCRAPER_HTTP_CONCURRENCY) as fetchers:
+        return dict(zip(urls, fetchers.map(fetch_image, urls)))
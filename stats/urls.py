@@ -1,5 +1,12 @@
-from django.urls import path
-from . import views
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+from . import api, views
+
+# JSON API for apps: /api/v1/teams/, /api/v1/players/, /api/v1/stats/
+router = DefaultRouter()
+router.register('teams', api.TeamViewSet)
+router.register('players', api.PlayerViewSet)
+router.register('stats', api.PlayerStatViewSet)
 
 urlpatterns = [
     path('', views.index, name='index'),  # Front page
@@ -7,4 +14,7 @@ urlpatterns = [
     path('team/<int:team_id>/', views.team_detail, name='team_detail'),  # Team details
     path('player/<int:player_id>/<slug:player_name>/', views.player_detail, name='player_detail'),
     path('search/', views.player_search, name='player_search'),  # Player search
+    path('leaderboards/<path:stat>/', views.leaderboard, name='leaderboard'),  # Top players for a stat
+    path('v1/', include(router.urls)),
+    path('changes/', api.ChangeList.as_view(), name='changes'),  # Delta sync
 ]
\ No newline at end of file
@@ -1,71 +1,198 @@
-from collections import defaultdict
+import mimetypes
+from datetime import timedelta
+from inspect import iscoroutinefunction
+from functools import wraps
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.core.cache import cache
-import requests
 from django.conf import settings
-from bs4 import BeautifulSoup
-from django.http import JsonResponse
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-import time
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from . import scrape
-from .models import Team, Player 
-
-
-def player_detail(request, player_id, player_name):
+from django.db.models import Count, Max
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers, patch_cache_control
+from django.views.decorators.http import condition
+from . import caching, images, jobs, metrics, search
+from .models import Team, Player
+from .leaderboards import leaderboards
+from .freshness import is_stale, ttl
+
+
+def conditional_page(validators):
+    """
+    Answer conditional GETs for a page from its content version, before running the view.
+
+    `validators(*view_args)` returns (etag, last_modified), or None for content without a
+    version; a matching If-None-Match / If-Modified-Since gets a 304 without loading stats or
+    rendering the template. Pages get a short public Cache-Control, placeholders and errors none.
+    Async views get the validators looked up in a thread, since condition() calls them synchronously.
+    """
+    def decorator(view):
+        def lookup(request, *args, **kwargs):
+            # Both validator functions share one query per request
+            if not hasattr(request, 'page_validators'):
+                request.page_validators = validators(*args, **kwargs) or (None, None)
+            return request.page_validators
+
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: lookup(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: lookup(request, *args, **kwargs)[1],
+        )(view)
+
+        def finish(response):
+            if response.status_code in (200, 304):
+                # A 304 is the browser's (or a proxy's) copy being reused
+                metrics.cache_lookup('page', response.status_code == 304)
+                patch_cache_control(response, public=True, max_age=settings.PAGE_CACHE_MAX_AGE)
+            else:
+                add_never_cache_headers(response)
+            return response
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                request.page_validators = await sync_to_async(validators)(*args, **kwargs) or (None, None)
+                return finish(await conditional_view(request, *args, **kwargs))
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return finish(conditional_view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def player_validators(player_id, player_name):
+    row = caching.cached_validators(caching.PLAYER, player_id, lambda: Player.objects.filter(
+        player_id=player_id
+    ).exclude(version='').values_list('version', 'updated_at', 'expires_at', 'nationality', 'flag_image').first())
+    if row:
+        version, updated_at, expires_at, nationality, flag_image = row
+        # Cached pages and 304s never reach the view, so expired or incomplete data is queued for a refresh
+        # here; not again if it was just scraped, since some players have no flag upstream either
+        if expires_at is None or expires_at <= timezone.now() or nationality == 'Unknown' or not flag_image:
+            jobs.refresh('player', player_id, player_name, within=ttl('player'))
+        return version, updated_at
+    return None
+
+
+def team_validators(team_id):
+    row = caching.cached_validators(caching.SQUAD, team_id, lambda: Team.objects.filter(
+        id=team_id
+    ).exclude(version='').values_list('name', 'version', 'updated_at', 'expires_at').first())
+    if row:
+        name, version, updated_at, expires_at = row
+        if expires_at is not None and expires_at <= timezone.now():
+            jobs.refresh('squad', team_id, name.replace(' ', '-'), within=ttl('team'))
+        return caching.team_etag(version, updated_at), updated_at
+    return None
+
+
+def teams_validators():
+    updated_at, count = caching.cached_validators(caching.TEAMS, 'all', lambda: tuple(
+        Team.objects.aggregate(updated_at=Max('updated_at'), count=Count('id')).values()
+    ))
+    if updated_at:
+        # Like the other pages, refreshed here since cached pages and 304s never reach the view;
+        # the marker is set by every scrape of the club list and expires with its TTL
+        if not cache.has_key(caching.cache_key(caching.TEAMS, 'fresh')):
+            jobs.refresh('teams', within=ttl('teams'))
+        return caching.teams_etag(updated_at, count), updated_at
+    return None
+
+
+def page_etag(request):
+    """The ETag conditional_page computed for this request; cached page data is keyed by it."""
+    return getattr(request, 'page_validators', (None, None))[0]
+
+
+def cached_page(namespace, *parts):
+    """
+    Serve a view's rendered page from the cache, keyed by its ETag: conditional_page already
+    answered from cached validators, so a hit costs no database query and no rendering.
+    Pages without an ETag (placeholders, players only known from a scrape) are never cached.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            etag = page_etag(request)
+            key = caching.cache_key(caching.HTML, namespace, *[kwargs[part] for part in parts], etag) if etag else None
+            html = await caching.aget(key) if key else None
+            if html is not None:
+                return HttpResponse(html)
+
+            response = await view(request, *args, **kwargs)
+            if key and response.status_code == 200:
+                await cache.aset(key, response.content, settings.PAGE_RENDER_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
+
+
+def render_page(request, template_name, context=None, status=None):
+    with metrics.timer(metrics.render_seconds, 'render', template=template_name):
+        return render(request, template_name, context, status=status)
+
+
+async def arender_page(request, template_name, context=None, status=None):
+    # Templates can still hit the database (lazy querysets, related objects), so they render in a thread
+    return await sync_to_async(render_page)(request, template_name, context, status=status)
+
+
+async def scrape_pending(request, message):
+    # Placeholder while a scrape_worker fetches the data; the page reloads itself
+    retry_after = settings.SCRAPE_PENDING_RETRY_AFTER
+    response = await arender_page(request, 'pending.html', {'message': message, 'retry_after': retry_after}, status=202)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+async def queue_and_wait(job):
+    """
+    Wait up to SCRAPE_REQUEST_WAIT seconds for a queued scrape. Concurrent requests for the
+    same data share one job, so they all wait on the same scrape instead of starting their own.
+    """
+    return job is not None and await jobs.await_for(job, settings.SCRAPE_REQUEST_WAIT)
+
+
+@conditional_page(player_validators)
+@cached_page(caching.PLAYER, 'player_id')
+async def player_detail(request, player_id, player_name):
     try:
+        # The ETag is the player's content version, so a cached entry under it is current;
+        # the validators already queued a refresh if the data expired
+        etag = page_etag(request)
+        context = await caching.aget(caching.cache_key(caching.PLAYER, player_id, etag)) if etag else None
+        if context is not None:
+            return await arender_page(request, 'playerdetails.html', context)
+
         # Check if the player exists in the database
-        player = Player.objects.filter(player_id=player_id).first()
-
-        if player and player.stats and player.nationality != 'Unknown' and player.flag_image:
-            # Use the existing player data without modifying the image
-            player_data = {
-                'name': player.name,
-                'position': player.position,
-                'nationality': player.nationality,
-                'flag_image': player.flag_image,
-                'stats': player.stats
-            }
+        player = await Player.objects.filter(player_id=player_id).afirst()
+
+        if player and player.stats:
+            # Serve what we have; refresh it in the background if it expired or is incomplete
+            if is_stale(player) or player.nationality == 'Unknown' or not player.flag_image:
+                await jobs.arefresh('player', player_id, player_name, within=ttl('player'))
         else:
-            # Scrape player data if missing or incomplete
-            player_data = scrape.scrape_player_data(player_id, player_name)
-
-            if player_data is None:
-                return JsonResponse({'error': f"No data found for player {player_name}"}, status=404)
-
-            # Save or update player data in the database, but don't update the image
-            if player:
-                player.name = player_data['name']
-                player.position = player_data['position']
-                player.nationality = player_data.get('nationality', player.nationality)
-                player.flag_image = player_data.get('flag_image', player.flag_image)
-                player.stats = player_data['stats']
-                player.save()
-            else:
-                Player.objects.create(
-                    player_id=player_id,
-                    name=player_data['name'],
-                    position=player_data['position'],
-                    nationality=player_data.get('nationality', 'Unknown'),
-                    image=player_data.get('image', 'https://resources.premierleague.com/premierleague/photos/players/110x140/Photo-Missing.png'),
-                    flag_image=player_data.get('flag_image', ''),
-                    stats=player_data['stats']
-                )
-
-        # Fetch the image directly from the database
-        player_image = player.image if player else 'https://resources.premierleague.com/premierleague/photos/players/110x140/Photo-Missing.png'
-
-        # Render player data and the image separately to the HTML template
-        context = {
-            'player': player_data,
-            'image': player_image  # Pass the image directly
-        }
-        return render(request, 'playerdetails.html', context)
+            # Players we can't store (not in any squad yet) are served from the last scrape job's result
+            job = None if player else await jobs.arecently_done('player', player_id, within=ttl('player'))
+            if job is None:
+                # Nothing cached yet: have a worker scrape the player data, and give it a moment
+                job = await jobs.aenqueue('player', player_id, player_name, priority=jobs.PRIORITY_HIGH)
+                if not await queue_and_wait(job):
+                    return await scrape_pending(request, f"Loading the stats of {player_name}.")
+                job = await jobs.arecently_done('player', player_id, within=ttl('player'))
+                if player:
+                    await player.arefresh_from_db()
+
+        if player:
+            # Use the existing player data and image from the database
+            context = caching.player_entry(player)
+            if player.version:
+                await cache.aset(caching.cache_key(caching.PLAYER, player_id, player.version), context)
+        else:
+            context = {'player': job.result, 'image': images.MISSING_PHOTO}
+
+        return await arender_page(request, 'playerdetails.html', context)
 
     except Exception as e:
         print(f"Error fetching player details: {e}")
@@ -75,94 +202,162 @@ def player_detail(request, player_id, player_name):
 
 
 def index(request):
-    return render(request, 'home.html')
+    return render_page(request, 'home.html')
 
 
-def teams_list(request):
-    teams = scrape.scrape_team_data()  # Use the new scraper to get team data
-    return render(request, 'teams.html', {'teams': teams})
+async def saved_teams(etag=None):
+    key = caching.cache_key(caching.TEAMS, 'saved', etag) if etag else None
+    teams = await caching.aget(key) if key else None
+    if teams is None:
+        teams = [caching.team_entry(team) async for team in Team.objects.order_by('name')]
+        if key and teams:
+            await cache.aset(key, teams)
+    return teams
 
-def team_detail(request, team_id):
-    try:
-        # Check if the team exists in the database
-        team = Team.objects.get(id=team_id)
 
-        # Check if players for this team exist in the database
-        players = Player.objects.filter(team=team)
+@conditional_page(teams_validators)
+@cached_page(caching.TEAMS)
+async def teams_list(request):
+    teams = await saved_teams(page_etag(request))
 
-        # If no players found, run the scrape function to get them
-        if not players.exists():
-            # Scrape players for the selected team
-            club_name = team.name.replace(' ', '-')  # Format club name for the URL
-            players_data = scrape.scrape_club_squad(team_id, club_name)  # Get players from the scraper
-
-            # Save the scraped players to the database
-            for player_data in players_data:
-                Player.objects.create(
-                    player_id=player_data['id'],
-                    name=player_data['name'],
-                    position=player_data['position'],
-                    nationality=player_data['nationality'],
-                    image=player_data['image'],
-                    flag_image=player_data['flag_image'],  # Assuming flag_image is stored
-                    team=team
-                )
-
-            # Fetch the newly saved players
-            players = Player.objects.filter(team=team)
+    if not teams:
+        if not await queue_and_wait(await jobs.aenqueue('teams', priority=jobs.PRIORITY_HIGH)):
+            return await scrape_pending(request, "Loading the Premier League clubs.")
+        teams = await saved_teams()
 
-    except Team.DoesNotExist:
-        # If team not found in the database, scrape the data and save it
-        teams_data = scrape.scrape_team_data()
+    return await arender_page(request, 'teams.html', {'teams': teams})
+
+@conditional_page(team_validators)
+@cached_page(caching.SQUAD, 'team_id')
+async def team_detail(request, team_id):
+    # Keyed by the ETag, which changes with the team and its squad; expiry was handled by the validators
+    etag = page_etag(request)
+    key = caching.cache_key(caching.SQUAD, team_id, etag) if etag else None
+    squad = await caching.aget(key) if key else None
+    if squad is not None:
+        return await arender_page(request, 'teamdetails.html', squad)
 
-        # Find the team from the scraped data
-        team_data = next((team for team in teams_data if str(team['id']) == str(team_id)), None)
+    try:
+        # Check if the team exists in the database
+        team = await Team.objects.aget(id=team_id)
+
+    except Team.DoesNotExist:
+        # Unknown team: it only exists if a recent scrape of the club list saved it
+        if await jobs.arecently_done('teams', within=ttl('teams')):
+            return JsonResponse({'error': 'Team not found'}, status=404)
 
-        if not team_data:
+        if not await queue_and_wait(await jobs.aenqueue('teams', priority=jobs.PRIORITY_HIGH)):
+            return await scrape_pending(request, "Loading the Premier League clubs.")
+        team = await Team.objects.filter(id=team_id).afirst()
+        if team is None:
             return JsonResponse({'error': 'Team not found'}, status=404)
 
-        # Save the team to the database
-        team = Team.objects.create(
-            id=team_data['id'],
-            name=team_data['name'],
-            logo=team_data['logo']
-        )
-
-        # Scrape players for the selected team
-        club_name = team.name.replace(' ', '-')  # Format club name for the URL
-        players_data = scrape.scrape_club_squad(team_id, club_name)  # Get players from the scraper
-
-        # Save the scraped players to the database
-        for player_data in players_data:
-            Player.objects.create(
-                player_id=player_data['id'],
-                name=player_data['name'],
-                position=player_data['position'],
-                nationality=player_data['nationality'],
-                image=player_data['image'],
-                flag_image=player_data['flag_image'],  # Assuming flag_image is stored
-                team=team
-            )
-
-        # Fetch the newly saved players
+    # Check if players for this team exist in the database
+    players = Player.objects.filter(team=team)
+
+    club_name = team.name.replace(' ', '-')  # Format club name for the URL
+
+    if not await players.aexists():
+        # No players yet: have a worker scrape the squad, and give it a moment
+        if not await queue_and_wait(await jobs.aenqueue('squad', team_id, club_name, priority=jobs.PRIORITY_HIGH)):
+            return await scrape_pending(request, f"Loading the {team.name} squad.")
         players = Player.objects.filter(team=team)
+    elif is_stale(team):
+        # Serve the saved squad and refresh it in the background
+        await jobs.arefresh('squad', team_id, club_name, within=ttl('team'))
 
-    # Render the team details and player list in the template
-    return render(request, 'teamdetails.html', {'team': team, 'players': players})
+    squad = caching.squad_entry(team, [player async for player in players])
+    if key:
+        await cache.aset(key, squad)
 
+    # Render the team details and player list in the template
+    return await arender_page(request, 'teamdetails.html', squad)
 
-def player_search(request):
-    query = request.GET.get('q', '').lower()
 
-    # Scrape player list from the Premier League website
-    players = scrape.scrape_player_list()  # Scraper replaces the cache retrieval
-    print(players)
+async def player_search(request):
+    query = request.GET.get('q', '')
 
-    if not players:
-        return render(request, 'player_search.html', {'players': [], 'query': query})
+    # Matched against the FTS5 tables (stats/search.py); results are cached until a player or team changes
+    key = await sync_to_async(caching.search_key)(query)
+    players = await caching.aget(key)
+    if players is None:
+        players = await sync_to_async(search.search_players)(query)
+        await cache.aset(key, players, settings.SEARCH_CACHE_TIMEOUT)
 
-    # Filter players based on the search query
-    filtered_players = [player for player in players if query in player.get('name', '').lower()]
+    return await arender_page(request, 'player_search.html', {'players': players, 'query': query})
 
-    return render(request, 'player_search.html', {'players': filtered_players, 'query': query})
 
+def leaderboard(request, stat):
+    position = request.GET.get('position')
+    team = request.GET.get('team')
+    try:
+        limit = min(int(request.GET.get('limit', 10)), settings.LEADERBOARD_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+
+    team_id = None
+    if team:
+        if team.isdigit():
+            team_id = int(team)
+        else:
+            team_id = Team.objects.filter(name__iexact=team.replace('-', ' ')).values_list('id', flat=True).first()
+            if team_id is None:
+                return JsonResponse({'error': f"Team {team} not found"}, status=404)
+
+    # Rankings come from the precomputed store, not from scanning the players
+    results = leaderboards.top(stat, position=position, team_id=team_id, limit=max(limit, 1))
+    if results is None:
+        return JsonResponse({'error': f"Unknown stat {stat}", 'stats': leaderboards.stat_keys()}, status=404)
+
+    return JsonResponse({
+        'stat': stat,
+        'position': position,
+        'team': team,
+        'results': results,
+    })
+
+
+def metrics_view(request):
+    """This process's metrics in the Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(metrics.render_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# A year: media URLs are named by the image's content, so they never need revalidating
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def image_response(path, max_age, **cache_control):
+    response = FileResponse(open(path, 'rb'), content_type=mimetypes.guess_type(path.name)[0])
+    patch_cache_control(response, public=True, max_age=max_age, **cache_control)
+    return response
+
+
+def media(request, size, name):
+    """A stored image (or its `size` variant), e.g. /media/thumb/<sha256>.png."""
+    path = images.variant(size, name)
+    if path is None:
+        raise Http404
+    return image_response(path, IMMUTABLE_MAX_AGE, immutable=True)
+
+
+def media_fetch(request, size, token):
+    """An image that wasn't prefetched: served like media() once a scrape worker has stored it."""
+    url = images.unsign(token)
+    if url is None or size not in images.sizes():
+        raise Http404
+    name = images.stored_name(url)
+    metrics.cache_lookup('image', name is not None)
+    if name is None:
+        # Downloaded in the background, and not again for a while if that failed
+        jobs.refresh('image', url, within=timedelta(seconds=settings.IMAGE_FAILURE_TIMEOUT))
+    path = images.variant(size, name) if name else None
+    if path is None:
+        # Not stored (yet, or it's an SVG or upstream failed): the browser loads the original.
+        # The URL came out of our own signed token, so this doesn't redirect anywhere else
+        response = HttpResponseRedirect(url)
+        patch_cache_control(response, public=True, max_age=settings.IMAGE_FAILURE_TIMEOUT)
+        return response
+    # Pages rendered from now on link to the content-named URL; this one may be re-fetched
+    return image_response(path, settings.PAGE_CACHE_MAX_AGE)